@@ -0,0 +1,232 @@
+"""
+Resized renditions of uploaded images.
+
+Every upload stored through a `RenditionImageField` gets one re-encoded copy
+per entry of settings.IMAGE_RENDITIONS['SIZES'], next to the original under
+`<dir>/renditions/`. Renditions are orientation-corrected, stripped of EXIF
+and other metadata, and written as WebP (or progressive JPEG when Pillow has
+no WebP support). `RenditionsField` exposes their URLs to the API.
+
+The work happens in a background job (`manage.py run_jobs`), which records the
+renditions it wrote in the field's `renditions_field` on the owning row. URLs
+are built from that record alone; until it names a rendition of the current
+file, the API serves the original image in its place. The same job deletes
+the renditions of a replaced file, and of the file of a deleted row.
+"""
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models import signals
+from django.db.models.fields.files import ImageFieldFile
+from django.dispatch import Signal
+from PIL import Image, ImageOps, features
+from rest_framework import serializers
+
+from jobs.queue import enqueue
+
+
+# Sent by the job once the renditions of an image are recorded, with the model
+# as sender, the `pks` of its rows and the `field`. Caches holding the
+# placeholder URLs of those rows listen to it.
+renditions_ready = Signal()
+
+
+def _output_format():
+    image_format = settings.IMAGE_RENDITIONS['FORMAT'].upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def rendition_name(name, rendition):
+    """
+    Storage name of `rendition` for the original stored under `name`, e.g.
+    images/cat.png -> images/renditions/cat.png.thumb.webp. The storage may
+    still pick another name when it is taken.
+    """
+    directory, filename = posixpath.split(name)
+    extension = 'jpg' if _output_format() == 'JPEG' else _output_format().lower()
+    return posixpath.join(directory, 'renditions', f'{filename}.{rendition}.{extension}')
+
+
+def _encode(image, size, crop):
+    if crop:
+        image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+
+    image_format = _output_format()
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    # A freshly encoded image without exif= or icc_profile= carries no metadata
+    options = {'quality': settings.IMAGE_RENDITIONS['QUALITY'], 'optimize': True}
+    if image_format == 'JPEG':
+        options['progressive'] = True
+    elif image_format == 'WEBP':
+        options['method'] = 4
+
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def create_renditions(storage, original_name):
+    """
+    Decode the stored original once and write every configured rendition;
+    return {rendition: storage name}. Existing files are never overwritten,
+    as they may be recorded for another row. Fails on files Pillow cannot
+    fully decode, e.g. truncated uploads.
+    """
+    with storage.open(original_name, 'rb') as original:
+        image = Image.open(original)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+
+    names = {}
+    for rendition, spec in settings.IMAGE_RENDITIONS['SIZES'].items():
+        name = rendition_name(original_name, rendition)
+        content = _encode(image, (spec['width'], spec['height']), spec.get('crop', False))
+        names[rendition] = storage.save(name, ContentFile(content))
+    return names
+
+
+def delete_renditions(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def render_job(model, field, name, pk=None, stale=()):
+    """
+    Job handler: write the renditions of `name`, stored by `model`.`field` on
+    row `pk`, record them on the row and delete the ones they replace. Also
+    deletes the `stale` renditions of rows that no longer exist.
+    """
+    model = apps.get_model(model)
+    model_field = model._meta.get_field(field)
+    storage = model_field.storage
+    delete_renditions(storage, stale)
+
+    if name is None:
+        return
+    rows = model._default_manager.filter(**{field: name})
+    if pk is not None:
+        rows = rows.filter(pk=pk)
+    # Gone, or stores another file by now; its own job handles that one
+    if not rows.exists():
+        return
+
+    names = create_renditions(storage, name)
+    if model_field.renditions_field is None:
+        return
+
+    with transaction.atomic():
+        previous = dict(rows.select_for_update().values_list('pk', model_field.renditions_field))
+        updated = rows.update(**{model_field.renditions_field: {'source': name, 'names': names}})
+    if not updated:
+        # Replaced while rendering
+        delete_renditions(storage, names.values())
+        return
+
+    current = set(names.values())
+    delete_renditions(storage, {
+        old for record in previous.values() if record
+        for old in record.get('names', {}).values() if old not in current
+    })
+    renditions_ready.send(sender=model, pks=list(previous), field=field)
+
+
+def rendition_urls(field_file, request=None):
+    """
+    Map rendition name -> URL. Renditions not recorded for the current file
+    yet (the job is queued, failed, or predates the size) fall back to the
+    original.
+    """
+    if not field_file:
+        return None
+
+    record = None
+    if field_file.field.renditions_field is not None:
+        record = getattr(field_file.instance, field_file.field.renditions_field)
+    names = record['names'] if record and record.get('source') == field_file.name else {}
+
+    urls = {}
+    for rendition in settings.IMAGE_RENDITIONS['SIZES']:
+        url = field_file.storage.url(names[rendition]) if rendition in names else field_file.url
+        urls[rendition] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+class RenditionFieldFile(ImageFieldFile):
+    def save(self, name, content, save=True):
+        # Queued by the owner's post_save, once its primary key is known
+        self.instance.__dict__.setdefault('_pending_renditions', set()).add(self.field.name)
+        super().save(name, content, save)
+
+
+class RenditionImageField(models.ImageField):
+    """
+    ImageField that queues the rendering of the configured renditions
+    whenever a new file is stored. `renditions_field` names a JSONField of
+    the model where the job records the renditions it wrote, like
+    `width_field` does for the width.
+    """
+    attr_class = RenditionFieldFile
+
+    def __init__(self, *args, renditions_field=None, **kwargs):
+        self.renditions_field = renditions_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.renditions_field:
+            kwargs['renditions_field'] = self.renditions_field
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        if not cls._meta.abstract:
+            signals.post_save.connect(self.queue_renditions, sender=cls)
+            signals.post_delete.connect(self.queue_cleanup, sender=cls)
+
+    def queue_renditions(self, instance, **kwargs):
+        if self.attname not in instance.__dict__:
+            return
+        file = getattr(instance, self.attname)
+        pending = instance.__dict__.get('_pending_renditions', set())
+        if self.name in pending:
+            pending.discard(self.name)
+            enqueue('images.renditions', model=self.model._meta.label_lower, field=self.name,
+                    name=file.name, pk=instance.pk)
+        elif not file:
+            # Image cleared: drop the renditions of the old one
+            self.queue_cleanup(instance)
+            if instance.__dict__.get(self.renditions_field):
+                setattr(instance, self.renditions_field, {})
+                type(instance)._default_manager.filter(pk=instance.pk).update(**{self.renditions_field: {}})
+
+    def queue_cleanup(self, instance, **kwargs):
+        record = instance.__dict__.get(self.renditions_field) if self.renditions_field else None
+        if record and record.get('names'):
+            enqueue('images.renditions', model=self.model._meta.label_lower, field=self.name,
+                    name=None, pk=instance.pk, stale=list(record['names'].values()))
+
+
+class RenditionsField(serializers.Field):
+    """
+    Read-only serializer field rendering the rendition URLs of an image.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return rendition_urls(value, self.context.get('request'))
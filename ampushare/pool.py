@@ -0,0 +1,17 @@
+"""
+Process pools for management commands.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+
+def process_pool(workers):
+    """
+    ProcessPoolExecutor of `workers` processes with Django set up. Spawned
+    children set Django up from scratch instead of inheriting the parent's
+    open database connections through fork().
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=django.setup)
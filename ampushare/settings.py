@@ -56,7 +56,8 @@ INSTALLED_APPS = [
     'drf_yasg',
     "booking.apps.BookingConfig",
     "social.apps.SocialConfig",
-    "user.apps.UserConfig"
+    "user.apps.UserConfig",
+    "jobs.apps.JobsConfig"
 ]
 
 MIDDLEWARE = [
@@ -112,6 +113,13 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -135,7 +143,9 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=28),
     'SIGNING_KEY': env('SIMPLE_JWT_SIGNING_KEY', default=None) or SECRET_KEY,
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True
+    'BLACKLIST_AFTER_ROTATION': True,
+    # Revokes rotated refresh tokens in user/revocation.py
+    'TOKEN_REFRESH_SERIALIZER': 'user.serializers.TokenRefreshSerializer',
 }
 
 # Internationalization
@@ -159,6 +169,17 @@ STATIC_URL = 'static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# Resized copies written for every uploaded post, profile and doctor image
+IMAGE_RENDITIONS = {
+    'FORMAT': env("IMAGE_RENDITION_FORMAT", default='WEBP'),
+    'QUALITY': env.int("IMAGE_RENDITION_QUALITY", default=80),
+    'SIZES': {
+        'thumb': {'width': 160, 'height': 160, 'crop': True},
+        'feed': {'width': 720, 'height': 720},
+        'full': {'width': 1600, 'height': 1600},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -177,7 +198,7 @@ SPECTACULAR_SETTINGS = {
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -187,10 +208,95 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'user.User'
 
+# Background Jobs
+# ------------------------------------------------------------------------------
+# Handlers run by `manage.py run_jobs`, keyed by job kind
+JOBS = {
+    'HANDLERS': {
+        'images.renditions': 'ampushare.images.render_job',
+    },
+    'MAX_ATTEMPTS': env.int("JOBS_MAX_ATTEMPTS", default=3),
+    'RETRY_DELAY': env.int("JOBS_RETRY_DELAY", default=30),
+    'STALE_AFTER': env.int("JOBS_STALE_AFTER", default=600),
+}
+
+# Booking Settings
+# ------------------------------------------------------------------------------
+BOOKING = {
+    # Longest date range the slots endpoint computes in one request
+    'SLOTS_MAX_DAYS': env.int("BOOKING_SLOTS_MAX_DAYS", default=31),
+    'APPOINTMENT_PAGE_SIZE': env.int("BOOKING_APPOINTMENT_PAGE_SIZE", default=50),
+    'APPOINTMENT_MAX_PAGE_SIZE': env.int("BOOKING_APPOINTMENT_MAX_PAGE_SIZE", default=200),
+    # Seconds a stored response is replayed to requests with the same Idempotency-Key
+    'IDEMPOTENCY_TTL': env.int("BOOKING_IDEMPOTENCY_TTL", default=24 * 60 * 60),
+    # Seconds after which a key whose first request never finished (e.g. the
+    # worker died) can be claimed again
+    'IDEMPOTENCY_LEASE': env.int("BOOKING_IDEMPOTENCY_LEASE", default=120),
+    # Seconds the doctor directory stays cached; saving a doctor invalidates it
+    # sooner, but only on workers sharing the cache backend
+    'DIRECTORY_CACHE_TIMEOUT': env.int("BOOKING_DIRECTORY_CACHE_TIMEOUT", default=5 * 60),
+    # Longest date range the revenue report covers in one request
+    'REPORT_MAX_DAYS': env.int("BOOKING_REPORT_MAX_DAYS", default=366),
+}
+
 # Khalti Settings
 # ------------------------------------------------------------------------------
 KHALTI = {
     'EPAY_INITIATE_URL': env("KHALTI_EPAY_INITIATE_URL", default='https://a.khalti.com/api/v2/epayment/initiate/'),
     'EPAY_LOOKUP_URL': env("KHALTI_EPAY_LOOKUP_URL", default='https://a.khalti.com/api/v2/epayment/lookup/'),
     'EPAY_KEY': env("KHALTI_EPAY_KEY", default='Key 5256d5bc0c1b4c9c8b12d521263559d5'),
-}
\ No newline at end of file
+    # Appointment fee in rupees; Khalti amounts are in paisa
+    'APPOINTMENT_FEE': env.int("KHALTI_APPOINTMENT_FEE", default=20),
+    # Gateway client (booking/khalti.py)
+    'CONNECT_TIMEOUT': env.float("KHALTI_CONNECT_TIMEOUT", default=3.05),
+    'READ_TIMEOUT': env.float("KHALTI_READ_TIMEOUT", default=10),
+    'POOL_SIZE': env.int("KHALTI_POOL_SIZE", default=10),
+    'RETRIES': env.int("KHALTI_RETRIES", default=2),
+    'RETRY_BACKOFF': env.float("KHALTI_RETRY_BACKOFF", default=0.5),
+    'BREAKER_THRESHOLD': env.int("KHALTI_BREAKER_THRESHOLD", default=5),
+    'BREAKER_COOLDOWN': env.int("KHALTI_BREAKER_COOLDOWN", default=30),
+    # Concurrent lookups of `manage.py reconcile_payments`
+    'RECONCILE_WORKERS': env.int("KHALTI_RECONCILE_WORKERS", default=8),
+}
+
+# User Settings
+# ------------------------------------------------------------------------------
+USERS = {
+    'SEARCH_PAGE_SIZE': env.int("USERS_SEARCH_PAGE_SIZE", default=20),
+    'SEARCH_MAX_PAGE_SIZE': env.int("USERS_SEARCH_MAX_PAGE_SIZE", default=50),
+    # Deepest offset a search page may start at; ranked results past it are
+    # not worth an OFFSET scan.
+    'SEARCH_MAX_OFFSET': env.int("USERS_SEARCH_MAX_OFFSET", default=500),
+    'AUTOCOMPLETE_LIMIT': env.int("USERS_AUTOCOMPLETE_LIMIT", default=8),
+    'FOLLOW_PAGE_SIZE': env.int("USERS_FOLLOW_PAGE_SIZE", default=50),
+    'FOLLOW_MAX_PAGE_SIZE': env.int("USERS_FOLLOW_MAX_PAGE_SIZE", default=200),
+    # In-process follow graph (user/graph.py): ids held per worker process,
+    # and seconds before a loaded set is read again from the database. Sets
+    # are only held with a cache backend shared by the workers.
+    'FOLLOW_GRAPH_MAX_EDGES': env.int("USERS_FOLLOW_GRAPH_MAX_EDGES", default=2_000_000),
+    'FOLLOW_GRAPH_TTL': env.int("USERS_FOLLOW_GRAPH_TTL", default=60),
+    'SUGGESTIONS_LIMIT': env.int("USERS_SUGGESTIONS_LIMIT", default=20),
+    # Seconds an authenticated user is served from the cache; only used with a
+    # shared CACHE_URL backend, locmem loads the user on every request
+    'AUTH_CACHE_TIMEOUT': env.int("USERS_AUTH_CACHE_TIMEOUT", default=300),
+    # Refresh token revocation (user/revocation.py)
+    'REVOCATION_BLOOM_CAPACITY': env.int("USERS_REVOCATION_BLOOM_CAPACITY", default=100_000),
+    'REVOCATION_BLOOM_ERROR_RATE': env.float("USERS_REVOCATION_BLOOM_ERROR_RATE", default=0.001),
+    'REVOCATION_BLOOM_REFRESH': env.int("USERS_REVOCATION_BLOOM_REFRESH", default=300),
+    'REVOCATION_PRUNE_INTERVAL': env.int("USERS_REVOCATION_PRUNE_INTERVAL", default=3600),
+}
+
+# Social Settings
+# ------------------------------------------------------------------------------
+SOCIAL = {
+    'FEED_PAGE_SIZE': env.int("SOCIAL_FEED_PAGE_SIZE", default=20),
+    'FEED_MAX_PAGE_SIZE': env.int("SOCIAL_FEED_MAX_PAGE_SIZE", default=100),
+    # Authors with more followers than this are not fanned out on write;
+    # their followers pull the newest posts in when they open the feed.
+    'FANOUT_FOLLOWER_THRESHOLD': env.int("SOCIAL_FANOUT_FOLLOWER_THRESHOLD", default=5000),
+    'TIMELINE_PULL_LIMIT': env.int("SOCIAL_TIMELINE_PULL_LIMIT", default=50),
+    'TIMELINE_PULL_INTERVAL': env.int("SOCIAL_TIMELINE_PULL_INTERVAL", default=60),
+    'TIMELINE_BACKFILL_LIMIT': env.int("SOCIAL_TIMELINE_BACKFILL_LIMIT", default=200),
+    'FEED_CACHE_TIMEOUT': env.int("SOCIAL_FEED_CACHE_TIMEOUT", default=60),
+    'STORY_TTL': timedelta(hours=env.int("SOCIAL_STORY_TTL_HOURS", default=24)),
+}
@@ -0,0 +1,164 @@
+import json
+import shutil
+import tempfile
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ampushare import versions
+from ampushare.images import render_job
+from ampushare.pagination import KeysetPagination
+from booking.models import Doctor
+from social.models import Post
+from user.models import User
+
+
+def image_file(name, color, image_format):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format=image_format)
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+class RenditionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def doctor(self, number, image):
+        doctor = Doctor.objects.create(
+            first_name='Doc', last_name=str(number), email=f'doc{number}@example.com',
+            phone_number=f'98000000{number:02}', speciality='General', image=image,
+        )
+        render_job('booking.doctor', 'image', doctor.image.name, doctor.pk)
+        doctor.refresh_from_db()
+        return doctor
+
+    def thumb_color(self, doctor):
+        with doctor.image.storage.open(doctor.image_rendered['names']['thumb']) as thumb:
+            return Image.open(thumb).convert('RGB').getpixel((80, 80))
+
+    def test_originals_with_the_same_stem_keep_their_own_renditions(self):
+        red = self.doctor(1, image_file('cat.png', (255, 0, 0), 'PNG'))
+        blue = self.doctor(2, image_file('cat.jpg', (0, 0, 255), 'JPEG'))
+
+        self.assertTrue(set(red.image_rendered['names'].values()).isdisjoint(blue.image_rendered['names'].values()))
+        self.assertGreater(self.thumb_color(red)[0], 200)
+        self.assertGreater(self.thumb_color(blue)[2], 200)
+
+    def test_replacing_an_image_leaves_other_rows_renditions(self):
+        red = self.doctor(1, image_file('cat.png', (255, 0, 0), 'PNG'))
+        blue = self.doctor(2, image_file('cat.jpg', (0, 0, 255), 'JPEG'))
+
+        blue.image = image_file('dog.png', (0, 255, 0), 'PNG')
+        blue.save()
+        render_job('booking.doctor', 'image', blue.image.name, blue.pk)
+
+        storage = red.image.storage
+        self.assertTrue(all(storage.exists(name) for name in red.image_rendered['names'].values()))
+        self.assertGreater(self.thumb_color(red)[0], 200)
+
+
+class VersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_tokens_are_stable_until_bumped(self):
+        first = versions.current(['a', 'b'])
+
+        self.assertEqual(versions.current(['a', 'b']), first)
+        versions.bump(['a'])
+        bumped = versions.current(['a', 'b'])
+        self.assertNotEqual(bumped['a'], first['a'])
+        self.assertEqual(bumped['b'], first['b'])
+
+    def test_keys_change_with_the_token(self):
+        before = versions.key('scope', versions.token('scope'), 'page', 1)
+        versions.bump(['scope'])
+
+        self.assertTrue(before.startswith('scope:') and before.endswith(':page:1'))
+        self.assertNotEqual(versions.key('scope', versions.token('scope'), 'page', 1), before)
+
+
+class MixedOrderPagination(KeysetPagination):
+    ordering = ('type', '-created_at', 'id')
+    page_size = 3
+    max_page_size = 4
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='author', email='author@example.com')
+        now = timezone.now()
+        for index in range(10):
+            post = Post.objects.create(user=user, caption=str(index), type='PS'[index % 2])
+            # Pairs share a timestamp, so the id has to break ties
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(minutes=index // 2))
+        self.expected = list(Post.objects.order_by(*MixedOrderPagination.ordering).values_list('id', flat=True))
+
+    def page(self, **params):
+        paginator = MixedOrderPagination()
+        request = Request(APIRequestFactory().get('/posts', params))
+        page = paginator.paginate_queryset(Post.objects.all(), request)
+        return [post.pk for post in page], self.cursor(paginator.get_next_link()), \
+            self.cursor(paginator.get_previous_link())
+
+    @staticmethod
+    def cursor(link):
+        return link and parse_qs(urlsplit(link).query)['cursor'][0]
+
+    @staticmethod
+    def encode(payload):
+        return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def test_next_links_walk_every_row_once(self):
+        seen, pages = [], []
+        ids, cursor, previous = self.page()
+        self.assertIsNone(previous)
+        while True:
+            seen += ids
+            pages.append(ids)
+            if cursor is None:
+                break
+            ids, cursor, _ = self.page(cursor=cursor)
+
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 3, 1])
+
+    def test_previous_links_walk_back(self):
+        pages = [self.page()]
+        while pages[-1][1] is not None:
+            pages.append(self.page(cursor=pages[-1][1]))
+
+        back = pages[-1]
+        for expected in reversed(pages[:-1]):
+            back = self.page(cursor=back[2])
+            self.assertEqual(back[0], expected[0])
+        self.assertIsNone(back[2])
+
+    def test_tampered_cursors_are_not_found(self):
+        position = ['P', timezone.now().isoformat(), 1]
+        for cursor in (
+            'not base64!', self.encode([1, 2]), self.encode({'p': position}), self.encode({'p': position[:2], 'r': 0}),
+            self.encode({'p': ['P', 'yesterday', 1], 'r': 0}), self.encode({'p': ['P', position[1], 'x'], 'r': 0}),
+            self.encode({'p': ['P', None, 1], 'r': 0}), self.encode({'p': ['P', [1], 1], 'r': 0}),
+        ):
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.page(cursor=cursor)
+
+    def test_page_size_is_clamped(self):
+        for page_size, expected in (('2', 2), ('100', 4), ('0', 3), ('-1', 3), ('many', 3)):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(len(self.page(page_size=page_size)[0]), expected)
@@ -0,0 +1,65 @@
+"""
+Version tokens for invalidating cached values without knowing their keys.
+
+Every scope (a user's feed, a post, the doctor directory, ...) has a random
+token in the cache. Values built from a scope are stored under a key holding
+its current token; `bump` replaces the token, which orphans every value built
+on the old one until it expires. Tokens never expire themselves; one that was
+evicted is minted again, with the same effect as a bump.
+
+A bump only reaches other worker processes through a shared cache backend;
+see `is_shared`.
+"""
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def _token_key(scope):
+    return f'{scope}:version'
+
+
+def current(scopes):
+    """
+    {scope: token} for `scopes`, minting tokens for the ones that are missing.
+    """
+    keys = {scope: _token_key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+    tokens = {}
+    for scope, key in keys.items():
+        token = found.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            # A concurrent request may have minted one first; use that
+            if not cache.add(key, token, timeout=None):
+                token = cache.get(key, token)
+        tokens[scope] = token
+    return tokens
+
+
+def token(scope):
+    return current([scope])[scope]
+
+
+def bump(scopes):
+    """
+    Replace the tokens of `scopes`, orphaning every value built on them.
+    """
+    if scopes:
+        cache.set_many({_token_key(scope): uuid.uuid4().hex for scope in scopes}, timeout=None)
+
+
+def key(scope, token, *parts):
+    """
+    Cache key of a value built from `scope` at `token`.
+    """
+    return ':'.join([scope, token, *map(str, parts)])
+
+
+def is_shared(alias='default'):
+    """
+    Whether every worker process sees the entries of cache `alias`.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
@@ -16,3 +16,22 @@ class AppointmentAdmin(admin.ModelAdmin):
 @admin.register(models.Payment)
 class PaymentAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(models.DoctorAvailability)
+class DoctorAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes']
+    list_filter = ['weekday']
+
+
+@admin.register(models.IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'status_code', 'created_at', 'expires_at']
+    raw_id_fields = ['user']
+
+
+@admin.register(models.PaymentRollup)
+class PaymentRollupAdmin(admin.ModelAdmin):
+    list_display = ['day', 'doctor', 'payment_method', 'payment_status', 'count', 'amount']
+    list_filter = ['payment_method', 'payment_status']
+    date_hierarchy = 'day'
@@ -0,0 +1,68 @@
+"""
+Cached doctor directory.
+
+The serialized doctor list (whole, or of one speciality) and the number of
+doctors per speciality are cached under a version token for
+BOOKING['DIRECTORY_CACHE_TIMEOUT'] seconds. Saving or deleting a doctor, or
+the render job finishing a doctor's image renditions, replaces the token
+through a signal in booking/signals.py, so every cached page goes stale at
+once without having to know their keys. Bulk `update()`s skip signals; call
+`invalidate` after them.
+
+Replacing the token only reaches the workers sharing the cache backend; with
+a per-process backend such as locmem, the others serve their copy until the
+timeout, which is therefore kept to minutes.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from ampushare import versions
+
+from .models import Doctor
+from .serializers import DoctorSerializer
+
+_SCOPE = 'booking:doctors'
+
+
+def invalidate():
+    """
+    Drop every cached copy of the directory.
+    """
+    versions.bump([_SCOPE])
+
+
+def _cached(name, compute):
+    key = versions.key(_SCOPE, versions.token(_SCOPE), hashlib.md5(name.encode()).hexdigest())
+
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout=settings.BOOKING['DIRECTORY_CACHE_TIMEOUT'])
+    return value
+
+
+def doctors(request, speciality=None):
+    """
+    Serialized doctors, optionally of one speciality. Image URLs are absolute,
+    so the copy is cached per host the request came through.
+    """
+    def compute():
+        queryset = Doctor.objects.order_by('id')
+        if speciality is not None:
+            queryset = queryset.filter(speciality=speciality)
+        return DoctorSerializer(queryset, many=True, context={'request': request}).data
+
+    return _cached(f'list:{request.build_absolute_uri("/")}:{speciality}', compute)
+
+
+def speciality_counts():
+    """
+    [{'speciality': ..., 'count': ...}] ordered by speciality, for the filter chips.
+    """
+    def compute():
+        return list(Doctor.objects.values('speciality').annotate(count=Count('id')).order_by('speciality'))
+
+    return _cached('specialities', compute)
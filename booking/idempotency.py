@@ -0,0 +1,114 @@
+"""
+`Idempotency-Key` support for write endpoints.
+
+The first request carrying a key claims it, runs the view and stores its
+response under (user, key) for BOOKING['IDEMPOTENCY_TTL'] seconds; retries
+with the same key get the stored response back without running the view
+again. Anonymous requests are keyed by the key alone. Claiming and storing
+are two short transactions, so no database transaction or row lock is held
+while the view runs (e.g. during a gateway call): a duplicate arriving
+meanwhile is answered with 409 and can retry. A claim whose request never
+finished can be taken over after BOOKING['IDEMPOTENCY_LEASE'] seconds.
+Reusing a key for a different request is rejected with 422. Server errors
+and exceptions release the key, so those requests can be retried with it.
+
+`manage.py prune_idempotency_keys` deletes expired keys.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method, request.get_full_path(), request.body):
+        digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """
+    Return (record, None) when this request claimed `key`, or (None, response)
+    when it must not run.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.BOOKING['IDEMPOTENCY_LEASE'])
+    with transaction.atomic():
+        record, created = IdempotencyKey.objects.get_or_create(
+            user=user, key=key, defaults={'fingerprint': fingerprint, 'expires_at': lease},
+        )
+        if created:
+            return record, None
+
+        record = IdempotencyKey.objects.select_for_update().get(pk=record.pk)
+        if record.expires_at <= now:
+            # Expired, or claimed by a request that never finished
+            record.fingerprint, record.status_code, record.response = fingerprint, None, None
+            record.expires_at = lease
+            record.save(update_fields=['fingerprint', 'status_code', 'response', 'expires_at'])
+            return record, None
+
+    if record.fingerprint != fingerprint:
+        return None, Response({'detail': f'{HEADER} was already used for a different request.'},
+                              status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        return None, Response({'detail': f'A request with this {HEADER} is still in progress.'},
+                              status=status.HTTP_409_CONFLICT)
+    return None, Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(methods=('POST',)):
+    """
+    Make `methods` of a DRF view replayable by Idempotency-Key. Requests
+    without the header run as usual.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if request.method not in methods or not key:
+                return view(request, *args, **kwargs)
+            if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+                return Response({'detail': f'{HEADER} is too long.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            user = request.user if request.user.is_authenticated else None
+            record, response = _claim(user, key, _fingerprint(request))
+            if response is not None:
+                return response
+
+            # The lease identifies this claim; a request that took over an
+            # abandoned claim has moved it, so this one leaves the row alone.
+            claim = IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at)
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                claim.delete()
+                raise
+            if response.status_code >= 500:
+                claim.delete()
+                return response
+
+            claim.update(
+                status_code=response.status_code,
+                response=None if response.data is None else json.loads(JSONRenderer().render(response.data)),
+                expires_at=timezone.now() + timedelta(seconds=settings.BOOKING['IDEMPOTENCY_TTL']),
+            )
+            return response
+
+        return wrapper
+
+    return decorator
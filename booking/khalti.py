@@ -0,0 +1,137 @@
+"""
+Client for the Khalti ePayment gateway.
+
+A single `requests.Session` per process keeps TCP/TLS connections to Khalti
+alive between calls, and every call is bounded by connect and read timeouts.
+Lookups are idempotent, so they are retried with exponential backoff on
+connection errors, timeouts and 5xx responses; initiation is never retried,
+as a retry could start a second payment. After KHALTI['BREAKER_THRESHOLD']
+consecutive failures a circuit breaker rejects calls without touching the
+network for KHALTI['BREAKER_COOLDOWN'] seconds, then lets one call through
+to probe whether the gateway has recovered.
+
+URLs and the key come from settings.KHALTI, so the client can be pointed at a
+local stub server.
+"""
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class KhaltiError(Exception):
+    """
+    Khalti rejected the request; `data` holds its error response.
+    """
+
+    def __init__(self, data, status_code=None):
+        super().__init__(data)
+        self.data = data
+        self.status_code = status_code
+
+
+class KhaltiUnavailable(KhaltiError):
+    """
+    Khalti could not be reached, timed out, failed, or the breaker is open.
+    """
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: let this call probe, keep rejecting the others
+                # until it reports back.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class KhaltiClient:
+    def __init__(self, config=None):
+        self.config = config or settings.KHALTI
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.config['POOL_SIZE'], max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Authorization': self.config['EPAY_KEY']})
+        self.breaker = CircuitBreaker(self.config['BREAKER_THRESHOLD'], self.config['BREAKER_COOLDOWN'])
+
+    def initiate(self, payload):
+        """
+        Start an ePayment; returns Khalti's response with `pidx` and `payment_url`.
+        """
+        return self._post(self.config['EPAY_INITIATE_URL'], payload, retries=0)
+
+    def lookup(self, pidx):
+        """
+        Fetch the status of the ePayment `pidx`.
+        """
+        return self._post(self.config['EPAY_LOOKUP_URL'], {'pidx': pidx}, retries=self.config['RETRIES'])
+
+    def _post(self, url, payload, retries):
+        if not self.breaker.allow():
+            raise KhaltiUnavailable({'detail': 'Payment gateway is unavailable, try again later.'})
+
+        timeout = (self.config['CONNECT_TIMEOUT'], self.config['READ_TIMEOUT'])
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(self.config['RETRY_BACKOFF'] * 2 ** (attempt - 1))
+            try:
+                response = self.session.post(url, json=payload, timeout=timeout)
+            except requests.RequestException:
+                failure = KhaltiUnavailable({'detail': 'Payment gateway did not respond.'})
+                continue
+            if response.status_code >= 500:
+                failure = KhaltiUnavailable({'detail': 'Payment gateway error.'}, response.status_code)
+                continue
+            break
+        else:
+            self.breaker.record_failure()
+            raise failure
+
+        self.breaker.record_success()
+        try:
+            data = response.json()
+        except ValueError:
+            data = {'detail': response.text}
+        if not response.ok:
+            raise KhaltiError(data, response.status_code)
+        return data
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide client, sharing its connection pool across requests.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = KhaltiClient()
+        return _client
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from booking.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys and their stored responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+        pruned = 0
+
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            # One short transaction per batch keeps lock times bounded
+            with transaction.atomic():
+                IdempotencyKey.objects.filter(id__in=ids).delete()
+            pruned += len(ids)
+            self.stdout.write(f'Pruned {pruned} keys...')
+
+        self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} expired idempotency keys.'))
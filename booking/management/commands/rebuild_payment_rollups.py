@@ -0,0 +1,83 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from booking import rollups
+from booking.models import Payment, PaymentRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily payment rollups from the payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        first = Payment.objects.aggregate(first=Min('created_at'))['first']
+        start = rollups.day(first) if first is not None else timezone.localdate()
+        today = timezone.localdate()
+        step = timedelta(days=options['days'])
+
+        # The first range has no lower bound and the last no upper one, so
+        # rollups of payments outside the scanned days are rebuilt too.
+        rebuilt = 0
+        low = None
+        while True:
+            high = start + step
+            rebuilt += self.rebuild(low, None if high > today else high)
+            if high > today:
+                break
+            low = start = high
+            self.stdout.write(f'Rebuilt rollups up to {low}...')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} rollups.'))
+
+    def rebuild(self, low, high):
+        """
+        Replace the rollups of the days in [low, high) in one transaction,
+        so reports never see them partially rebuilt. Rollup writes wait for
+        it: payments saved meanwhile move the rollups after the rebuild
+        instead of being lost with the rows it replaces. Each range holds the
+        lock only for its own, indexed, aggregation.
+        """
+        payments = Payment.objects.all()
+        stale = PaymentRollup.objects.all()
+        if low is not None:
+            payments = payments.filter(created_at__gte=self.midnight(low))
+            stale = stale.filter(day__gte=low)
+        if high is not None:
+            payments = payments.filter(created_at__lt=self.midnight(high))
+            stale = stale.filter(day__lt=high)
+
+        with transaction.atomic():
+            self.lock_rollups()
+            stale.delete()
+            totals = list(
+                payments.annotate(row_day=TruncDate('created_at'), doctor_id=F('appointment__doctor_id'))
+                .values('row_day', 'doctor_id', 'payment_method', 'payment_status')
+                .annotate(count=Count('id'), amount=Sum('amount'))
+            )
+            PaymentRollup.objects.bulk_create([
+                PaymentRollup(day=row['row_day'], doctor_id=row['doctor_id'], payment_method=row['payment_method'],
+                              payment_status=row['payment_status'], count=row['count'], amount=row['amount'])
+                for row in totals
+            ], batch_size=1000)
+        return len(totals)
+
+    @staticmethod
+    def midnight(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @staticmethod
+    def lock_rollups():
+        # Lets reports read the old rollups but blocks every write, including
+        # the inserts of rows that do not exist yet. SQLite takes its database
+        # wide write lock with the first delete instead.
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                table = connection.ops.quote_name(PaymentRollup._meta.db_table)
+                cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
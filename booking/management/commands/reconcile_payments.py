@@ -0,0 +1,112 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from booking import khalti, rollups
+from booking.models import Payment
+
+# Khalti lookup status -> final payment status; anything else (Pending,
+# Initiated) is still in flight and checked again on the next run.
+FINAL_STATUSES = {
+    'Completed': Payment.PAYMENT_SUCCESS_STATUS,
+    'Expired': Payment.PAYMENT_FAILED_STATUS,
+    'User canceled': Payment.PAYMENT_FAILED_STATUS,
+    'Refunded': Payment.PAYMENT_FAILED_STATUS,
+    'Partially Refunded': Payment.PAYMENT_FAILED_STATUS,
+}
+
+
+def lookup(client, pidx):
+    try:
+        return client.lookup(pidx)
+    except khalti.KhaltiError as error:
+        return error
+
+
+class Command(BaseCommand):
+    help = 'Verify unconfirmed Khalti payments against the ePayment lookup API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Payments looked up per round')
+        parser.add_argument('--workers', type=int, default=None, help='Concurrent lookups (default: KHALTI setting)')
+
+    def handle(self, *args, **options):
+        client = khalti.get_client()
+        workers = options['workers'] or settings.KHALTI['RECONCILE_WORKERS']
+        outcomes = Counter()
+        last_id = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # Looked up without holding locks or a transaction: each
+                # lookup can take seconds. Overlapping runs (e.g. from cron)
+                # may look the same payment up twice, which is harmless.
+                payments = list(
+                    Payment.objects.filter(id__gt=last_id, pidx__isnull=False, verified_at__isnull=True)
+                    .order_by('id')[:options['batch_size']]
+                )
+                if not payments:
+                    break
+                last_id = payments[-1].id
+                results = dict(zip(
+                    (payment.id for payment in payments),
+                    pool.map(lambda payment: lookup(client, payment.pidx), payments),
+                ))
+
+                unavailable = 0
+                with transaction.atomic():
+                    # Re-read under lock; rows verified meanwhile drop out
+                    locked = Payment.objects.select_for_update().filter(
+                        id__in=list(results), verified_at__isnull=True
+                    ).order_by('id')
+                    changed, changes = [], []
+                    for payment in locked:
+                        before = rollups.snapshot(payment)
+                        outcome = self.apply(payment, results[payment.id])
+                        outcomes[outcome] += 1
+                        unavailable += outcome == 'unavailable'
+                        if outcome in ('verified', 'failed'):
+                            changed.append(payment)
+                            changes.append((before, rollups.snapshot(payment)))
+                    # bulk_update() sends no signals, so move the rollups here
+                    Payment.objects.bulk_update(changed, ['payment_status', 'verified_at'])
+                    rollups.apply(changes)
+
+                if unavailable == len(payments):
+                    self.stdout.write(self.style.WARNING('Payment gateway is unavailable, stopping early.'))
+                    break
+
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{count} {outcome}' for outcome, count in sorted(outcomes.items())
+        ) or 'Nothing to reconcile.'))
+
+    def apply(self, payment, result):
+        """
+        Move `payment` to the status Khalti reports; return the outcome label.
+        """
+        if isinstance(result, khalti.KhaltiUnavailable):
+            return 'unavailable'
+        if isinstance(result, khalti.KhaltiError) and result.status_code != 404:
+            # e.g. a bad key; the payment itself may be fine, so check again next run
+            self.stderr.write(f'Payment {payment.id} ({payment.pidx}): {result.data}')
+            return 'rejected'
+
+        if isinstance(result, khalti.KhaltiError):
+            # Khalti does not know the pidx, e.g. one a client made up
+            status = Payment.PAYMENT_FAILED_STATUS
+        else:
+            status = FINAL_STATUSES.get(result.get('status'))
+        if status is None:
+            return 'pending'
+        if status == Payment.PAYMENT_SUCCESS_STATUS and Decimal(result.get('total_amount', 0)) / 100 != payment.amount:
+            self.stderr.write(f'Payment {payment.id} ({payment.pidx}): paid {result.get("total_amount")} paisa')
+            status = Payment.PAYMENT_FAILED_STATUS
+
+        payment.payment_status = status
+        payment.verified_at = timezone.now()
+        return 'verified' if status == Payment.PAYMENT_SUCCESS_STATUS else 'failed'
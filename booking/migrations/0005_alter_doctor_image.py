@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:49
+
+import ampushare.images
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_remove_payment_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='doctor',
+            name='image',
+            field=ampushare.images.RenditionImageField(upload_to='images/'),
+        ),
+    ]
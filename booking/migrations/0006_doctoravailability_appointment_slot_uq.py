@@ -0,0 +1,64 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_no_double_bookings(apps, schema_editor):
+    # Appointments may carry payments, so double bookings are not deleted
+    # automatically; they have to be rescheduled before this migration.
+    Appointment = apps.get_model('booking', 'Appointment')
+    duplicates = list(
+        Appointment.objects.values('doctor_id', 'date', 'time')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)[:20]
+    )
+    if duplicates:
+        slots = ', '.join(f"doctor {row['doctor_id']} on {row['date']} at {row['time']}" for row in duplicates)
+        raise RuntimeError(f'Reschedule double-booked appointments before migrating: {slots}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_alter_doctor_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+            ],
+            options={
+                'verbose_name_plural': 'doctor availabilities',
+            },
+        ),
+        migrations.RunPython(check_no_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'time'), name='booking_appointment_slot_uq'),
+        ),
+        migrations.AddField(
+            model_name='doctoravailability',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availabilities', to='booking.doctor'),
+        ),
+        migrations.AddIndex(
+            model_name='doctoravailability',
+            index=models.Index(fields=['doctor', 'weekday'], name='booking_availability_doc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctoravailability',
+            constraint=models.CheckConstraint(check=models.Q(('end_time__gt', models.F('start_time'))), name='booking_availability_hours_ck'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctoravailability',
+            constraint=models.CheckConstraint(check=models.Q(('slot_minutes__gt', 0)), name='booking_availability_slot_ck'),
+        ),
+    ]
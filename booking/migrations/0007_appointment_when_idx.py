@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_doctoravailability_appointment_slot_uq'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time', 'id'], name='booking_appointment_when_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['speciality'], name='booking_doctor_speciality_idx'),
+        ),
+    ]
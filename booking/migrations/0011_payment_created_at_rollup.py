@@ -0,0 +1,58 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:09
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_created_at(apps, schema_editor):
+    # Payments never recorded when they were made; date existing ones at
+    # their appointment so the revenue rollups spread them over real days.
+    Payment = apps.get_model('booking', 'Payment')
+    tz = django.utils.timezone.get_default_timezone()
+
+    payments = Payment.objects.select_related('appointment').only(
+        'id', 'appointment__date', 'appointment__time'
+    ).order_by('id')
+    batch = []
+    for payment in payments.iterator(chunk_size=1000):
+        payment.created_at = datetime.datetime.combine(payment.appointment.date, payment.appointment.time, tz)
+        batch.append(payment)
+        if len(batch) == 1000:
+            Payment.objects.bulk_update(batch, ['created_at'])
+            batch = []
+    Payment.objects.bulk_update(batch, ['created_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_doctor_speciality_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='PaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(choices=[('K', 'Khalti'), ('E', 'Esewa')], max_length=1)),
+                ('payment_status', models.CharField(choices=[('P', 'Pending'), ('F', 'Failed'), ('S', 'Success')], max_length=1)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='booking.doctor')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'doctor', 'payment_method', 'payment_status'), name='booking_rollup_key_uq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:18
+
+import ampushare.images
+from django.db import migrations, models
+
+
+def queue_renditions(apps, schema_editor):
+    # Renditions of existing images are only served once a job records them
+    Doctor = apps.get_model('booking', 'Doctor')
+    Job = apps.get_model('jobs', 'Job')
+
+    rows = Doctor.objects.exclude(image='').exclude(image__isnull=True).values_list('pk', 'image')
+    Job.objects.bulk_create((
+        Job(kind='images.renditions', payload={'model': 'booking.doctor', 'field': 'image', 'name': name, 'pk': pk})
+        for pk, name in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+        ('booking', '0011_payment_created_at_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='image_rendered',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='image',
+            field=ampushare.images.RenditionImageField(renditions_field='image_rendered', upload_to='images/'),
+        ),
+        migrations.RunPython(queue_renditions, migrations.RunPython.noop),
+    ]
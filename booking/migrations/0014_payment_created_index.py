@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0013_idempotency_anonymous_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at'], name='booking_payment_created_idx'),
+        ),
+    ]
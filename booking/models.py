@@ -1,33 +1,90 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from ampushare.images import RenditionImageField
 
 
 class Doctor(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='images/')
+    image = RenditionImageField(upload_to='images/', renditions_field='image_rendered')
+    image_rendered = models.JSONField(default=dict, blank=True, editable=False)
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=15, unique=True)
     speciality = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['speciality'], name='booking_doctor_speciality_idx'),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.speciality}"
 
 
+class DoctorAvailability(models.Model):
+    """
+    Weekly recurring working hours of a doctor, split into bookable slots of
+    `slot_minutes` starting at `start_time` (see booking/slots.py).
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='availabilities')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        verbose_name_plural = 'doctor availabilities'
+        constraints = [
+            models.CheckConstraint(check=models.Q(end_time__gt=models.F('start_time')),
+                                   name='booking_availability_hours_ck'),
+            models.CheckConstraint(check=models.Q(slot_minutes__gt=0), name='booking_availability_slot_ck'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'weekday'], name='booking_availability_doc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
 class Appointment(models.Model):
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
     date = models.DateField()
     time = models.TimeField()
     remark = models.TextField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'time'], name='booking_appointment_slot_uq'),
+        ]
+        indexes = [
+            # Unfiltered calendar pages; per-doctor pages use the unique index
+            models.Index(fields=['date', 'time', 'id'], name='booking_appointment_when_idx'),
+        ]
+
     def __str__(self):
         return self.remark
 
 
 class Payment(models.Model):
+    PAYMENT_PENDING_STATUS = 'P'
     PAYMENT_FAILED_STATUS = 'F'
     PAYMENT_SUCCESS_STATUS = 'S'
 
     PAYMENT_STATUS_CHOICES = [
+        (PAYMENT_PENDING_STATUS, 'Pending'),
         (PAYMENT_FAILED_STATUS, 'Failed'),
         (PAYMENT_SUCCESS_STATUS, 'Success')
     ]
@@ -44,3 +101,69 @@ class Payment(models.Model):
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=7, decimal_places=2)
     payment_method = models.CharField(max_length=1, choices=PAYMENT_METHOD_CHOICES)
+    # Khalti ePayment id; set for payments the gateway has to confirm
+    pidx = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    verified_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(verified_at__isnull=True, pidx__isnull=False),
+                         name='booking_payment_unverified_idx'),
+            # Day ranges rebuilt by rebuild_payment_rollups
+            models.Index(fields=['created_at'], name='booking_payment_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The rollup signals then commit together with the row, so
+        # rebuild_payment_rollups never counts a payment whose rollup update is
+        # still to come. delete() already runs its signals in one transaction.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class PaymentRollup(models.Model):
+    """
+    Number and sum of the payments of a day per doctor, method and status,
+    kept up to date by booking/rollups.py.
+    """
+    day = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='+')
+    payment_method = models.CharField(max_length=1, choices=Payment.PAYMENT_METHOD_CHOICES)
+    payment_status = models.CharField(max_length=1, choices=Payment.PAYMENT_STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the date range scans of the revenue report
+            models.UniqueConstraint(fields=['day', 'doctor', 'payment_method', 'payment_status'],
+                                    name='booking_rollup_key_uq'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a write request sent with an `Idempotency-Key` header,
+    replayed to retries of the same request (see booking/idempotency.py).
+    Keys of anonymous requests have no user. `status_code` is empty while
+    the first request is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+',
+                             null=True, blank=True)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='booking_idempotency_key_uq'),
+            models.UniqueConstraint(fields=['key'], condition=models.Q(user__isnull=True),
+                                    name='booking_idempotency_anon_uq'),
+        ]
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,13 @@
+from django.conf import settings
+
+from ampushare.pagination import KeysetPagination
+
+
+class AppointmentPagination(KeysetPagination):
+    ordering = ('date', 'time', 'id')
+    page_size = settings.BOOKING['APPOINTMENT_PAGE_SIZE']
+    max_page_size = settings.BOOKING['APPOINTMENT_MAX_PAGE_SIZE']
+
+
+class PastAppointmentPagination(AppointmentPagination):
+    ordering = ('-date', '-time', '-id')
@@ -0,0 +1,82 @@
+"""
+Daily payment revenue per doctor, payment method and status.
+
+`PaymentRollup` keeps one row per (day, doctor, method, status) with the
+number and sum of those payments, so reports read a few rows per day instead
+of joining every payment to its appointment and doctor. Rows are moved by the
+difference each change makes: signals in booking/signals.py cover `save()`
+and `delete()`, and code bulk updating payments (see reconcile_payments)
+passes its changes to `apply` itself. Queryset `update()`s, and appointments
+moved to another doctor, are not tracked; `manage.py rebuild_payment_rollups`
+recomputes the table from the payments.
+"""
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Appointment, PaymentRollup
+
+FIELDS = ('appointment_id', 'created_at', 'payment_method', 'payment_status', 'amount')
+
+Snapshot = namedtuple('Snapshot', FIELDS)
+
+
+def snapshot(payment):
+    """
+    The rollup relevant fields of `payment`, or None for unsaved payments and
+    ones loaded without some of the fields.
+    """
+    if payment.pk is None or not all(field in payment.__dict__ for field in FIELDS):
+        return None
+    return Snapshot(*(payment.__dict__[field] for field in FIELDS))
+
+
+def day(created_at):
+    return timezone.localdate(created_at)
+
+
+def apply(changes):
+    """
+    Move the rollups by `changes`, (before, after) snapshot pairs where None
+    stands for a payment that did not / no longer exists.
+    """
+    changes = [(before, after) for before, after in changes if before != after]
+    if not changes:
+        return
+
+    appointment_ids = {snap.appointment_id for pair in changes for snap in pair if snap is not None}
+    doctors = dict(Appointment.objects.filter(id__in=appointment_ids).values_list('id', 'doctor_id'))
+
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for before, after in changes:
+        for snap, sign in ((before, -1), (after, 1)):
+            if snap is None or snap.appointment_id not in doctors:
+                continue
+            delta = deltas[(day(snap.created_at), doctors[snap.appointment_id], snap.payment_method,
+                            snap.payment_status)]
+            delta[0] += sign
+            delta[1] += sign * Decimal(str(snap.amount))
+
+    with transaction.atomic():
+        # Sorted, so concurrent writers lock the rows in the same order
+        for (row_day, doctor_id, method, status), (count, amount) in sorted(deltas.items()):
+            if not count and not amount:
+                continue
+            key = {'day': row_day, 'doctor_id': doctor_id, 'payment_method': method, 'payment_status': status}
+            rows = PaymentRollup.objects.filter(**key)
+            if rows.update(count=F('count') + count, amount=F('amount') + amount):
+                if count < 0:
+                    rows.filter(count__lte=0).delete()
+                continue
+            if count <= 0:
+                # Already gone, e.g. deleted along with its doctor
+                continue
+            try:
+                with transaction.atomic():
+                    PaymentRollup.objects.create(**key, count=count, amount=amount)
+            except IntegrityError:
+                # Created by a concurrent payment in the meantime
+                rows.update(count=F('count') + count, amount=F('amount') + amount)
@@ -1,21 +1,117 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from .models import Doctor, Payment, Appointment
+from ampushare.images import RenditionsField
+from . import slots
+from .models import Doctor, Payment, Appointment, PaymentRollup
+
+
+class DoctorSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Doctor
+        fields = ['id', 'first_name', 'last_name', 'speciality', 'image']
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
+    doctor_summary = DoctorSummarySerializer(source='doctor', read_only=True)
+
     class Meta:
         model = Appointment
         fields = '__all__'
 
+    def validate(self, attrs):
+        if not slots.is_bookable(attrs['doctor'].pk, attrs['date'], attrs['time']):
+            raise serializers.ValidationError({'time': _("Not one of the doctor's available slots.")})
+        return attrs
+
+
+class AppointmentFilterSerializer(serializers.Serializer):
+    WHEN_UPCOMING = 'upcoming'
+    WHEN_PAST = 'past'
+
+    doctor = serializers.IntegerField(required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    when = serializers.ChoiceField(choices=[WHEN_UPCOMING, WHEN_PAST], required=False)
+
+
+class SlotRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('start', timezone.localdate())
+        attrs.setdefault('end', attrs['start'] + datetime.timedelta(days=6))
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({'end': _('Must not be before start.')})
+        if (attrs['end'] - attrs['start']).days >= settings.BOOKING['SLOTS_MAX_DAYS']:
+            raise serializers.ValidationError(
+                {'end': _('At most %(days)d days can be requested.') % {'days': settings.BOOKING['SLOTS_MAX_DAYS']}}
+            )
+        return attrs
+
+
+class RevenueFilterSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    doctor = serializers.IntegerField(required=False)
+    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES, required=False)
+    payment_status = serializers.ChoiceField(choices=Payment.PAYMENT_STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({'end': _('Must not be before start.')})
+        if (attrs['end'] - attrs['start']).days >= settings.BOOKING['REPORT_MAX_DAYS']:
+            raise serializers.ValidationError(
+                {'end': _('At most %(days)d days can be requested.') % {'days': settings.BOOKING['REPORT_MAX_DAYS']}}
+            )
+        return attrs
+
+
+class PaymentRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PaymentRollup
+        fields = ['day', 'doctor', 'payment_method', 'payment_status', 'count', 'amount']
+
+
+class DaySlotsSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    slots = serializers.ListField(child=serializers.TimeField())
+
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
+        read_only_fields = ['verified_at']
+
+    def validate(self, attrs):
+        method = attrs.get('payment_method', getattr(self.instance, 'payment_method', None))
+        pidx = attrs.get('pidx', getattr(self.instance, 'pidx', None))
+        if method == Payment.PAYMENT_KHALTI and not pidx:
+            raise serializers.ValidationError({'pidx': _('Khalti payments need the pidx of their ePayment.')})
+        if pidx:
+            # The gateway decides; `manage.py reconcile_payments` verifies it
+            attrs['payment_status'] = Payment.PAYMENT_PENDING_STATUS
+        return attrs
 
 
 class DoctorSerializer(serializers.ModelSerializer):
+    image_renditions = RenditionsField(source='image')
+
     class Meta:
         model = Doctor
-        fields = '__all__'
+        exclude = ['image_rendered']
+
+
+class DoctorFilterSerializer(serializers.Serializer):
+    speciality = serializers.CharField(max_length=100, required=False)
+
+
+class SpecialityCountSerializer(serializers.Serializer):
+    speciality = serializers.CharField()
+    count = serializers.IntegerField()
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, pre_delete, post_save, post_delete
+from django.dispatch import receiver
+
+from ampushare.images import renditions_ready
+
+from . import directory, rollups
+from .models import Doctor, Payment
+
+"""
+Doctor directory cache
+
+Invalidated once the transaction commits, so a request running in between
+cannot cache the directory as it was before the change. The render job
+records new image renditions without saving the doctor, so its
+`renditions_ready` signal invalidates the directory too.
+"""
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(renditions_ready, sender=Doctor)
+def invalidate_directory(sender, **kwargs):
+    transaction.on_commit(directory.invalidate)
+
+
+"""
+Payment rollups
+
+Each payment remembers the values it was loaded or last saved with, so a save
+only moves the rollups by what it changed.
+"""
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment(sender, instance, **kwargs):
+    instance._rollup_snapshot = rollups.snapshot(instance)
+
+
+def _stored_snapshot(payment):
+    # For payments loaded with deferred fields
+    stored = Payment.objects.filter(pk=payment.pk).first()
+    return stored and stored._rollup_snapshot
+
+
+@receiver(pre_save, sender=Payment)
+@receiver(pre_delete, sender=Payment)
+def load_payment_snapshot(sender, instance, **kwargs):
+    if instance._rollup_snapshot is None and not instance._state.adding:
+        instance._rollup_snapshot = _stored_snapshot(instance)
+
+
+@receiver(post_save, sender=Payment)
+def update_payment_rollups(sender, instance, update_fields, **kwargs):
+    before = instance._rollup_snapshot
+    current = rollups.snapshot(instance)
+    if current is None:
+        current = _stored_snapshot(instance)
+    elif update_fields is not None and before is not None:
+        # Fields left out of the save keep their stored values
+        saved = {Payment._meta.get_field(name).attname for name in update_fields}
+        current = before._replace(**{field: getattr(current, field) for field in rollups.FIELDS if field in saved})
+    rollups.apply([(before, current)])
+    instance._rollup_snapshot = current
+
+
+@receiver(post_delete, sender=Payment)
+def remove_payment_rollups(sender, instance, **kwargs):
+    rollups.apply([(instance._rollup_snapshot, None)])
@@ -0,0 +1,71 @@
+"""
+Free appointment slots.
+
+A doctor's slots on a date come from their `DoctorAvailability` rows for that
+weekday, cut into `slot_minutes` steps. Slots taken by an `Appointment` are
+dropped; the booked slots of the whole date range are read with one query
+over the (doctor, date, time) unique index, which also makes booking a taken
+slot fail with an IntegrityError.
+"""
+import datetime
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import Appointment, DoctorAvailability
+
+
+def _slot_times(availability):
+    start = datetime.datetime.combine(datetime.date.min, availability.start_time)
+    end = datetime.datetime.combine(datetime.date.min, availability.end_time)
+    step = datetime.timedelta(minutes=availability.slot_minutes)
+    while start + step <= end:
+        yield start.time()
+        start += step
+
+
+def weekly_slots(doctor_id):
+    """
+    Map weekday -> sorted slot start times of the doctor's weekly template.
+    """
+    slots = defaultdict(set)
+    for availability in DoctorAvailability.objects.filter(doctor_id=doctor_id):
+        slots[availability.weekday].update(_slot_times(availability))
+    return {weekday: sorted(times) for weekday, times in slots.items()}
+
+
+def free_slots(doctor_id, start_date, end_date):
+    """
+    Return [(date, [time, ...])] of the free slots from `start_date` to
+    `end_date` inclusive, leaving out slots that have already started.
+    """
+    weekly = weekly_slots(doctor_id)
+    if not weekly:
+        return []
+
+    booked = set(
+        Appointment.objects.filter(doctor_id=doctor_id, date__range=(start_date, end_date))
+        .values_list('date', 'time')
+    )
+    now = timezone.localtime().replace(tzinfo=None)
+
+    result = []
+    day = start_date
+    while day <= end_date:
+        times = [
+            time for time in weekly.get(day.weekday(), ())
+            if (day, time) not in booked and datetime.datetime.combine(day, time) > now
+        ]
+        if times:
+            result.append((day, times))
+        day += datetime.timedelta(days=1)
+    return result
+
+
+def is_bookable(doctor_id, date, time):
+    """
+    Whether `time` on `date` is one of the doctor's slots. Doctors without
+    any availability set up accept every time.
+    """
+    weekly = weekly_slots(doctor_id)
+    return not weekly or time in weekly.get(date.weekday(), ())
@@ -1,3 +1,390 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from booking import khalti
+from booking.models import Appointment, Doctor, IdempotencyKey, Payment, PaymentRollup
+from user.models import User
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers each POST with the server's reply for the posted pidx, if it has
+    one, or else the next (status, body, delay) of its `replies`, repeating
+    the last one. Records the request paths.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(self.path)
+        replies = self.server.replies
+        if payload.get('pidx') in self.server.by_pidx:
+            status, body, delay = self.server.by_pidx[payload['pidx']]
+        else:
+            status, body, delay = replies.pop(0) if len(replies) > 1 else replies[0]
+        if delay:
+            time.sleep(delay)
+
+        content = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except ConnectionError:
+            # The client timed out and hung up
+            pass
+
+
+class KhaltiStubMixin:
+    """
+    Runs a local HTTP server standing in for the Khalti ePayment API.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.server.requests = []
+        self.server.by_pidx = {}
+        self.reply((200, {}))
+
+    def reply(self, *replies):
+        """
+        Queue replies given as (status, body) or (status, body, delay).
+        """
+        self.server.replies = [reply if len(reply) == 3 else (*reply, 0) for reply in replies]
+
+    def config(self, **overrides):
+        base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        return {
+            'EPAY_INITIATE_URL': f'{base}/initiate/',
+            'EPAY_LOOKUP_URL': f'{base}/lookup/',
+            'EPAY_KEY': 'Key test',
+            'CONNECT_TIMEOUT': 1,
+            'READ_TIMEOUT': 1,
+            'POOL_SIZE': 2,
+            'RETRIES': 2,
+            'RETRY_BACKOFF': 0.01,
+            'BREAKER_THRESHOLD': 2,
+            'BREAKER_COOLDOWN': 60,
+            **overrides,
+        }
+
+
+class KhaltiClientTests(KhaltiStubMixin, SimpleTestCase):
+
+    def test_lookup_retries_server_errors(self):
+        self.reply((502, {}), (503, {}), (200, {'pidx': 'a', 'status': 'Completed'}))
+        client = khalti.KhaltiClient(self.config())
+
+        self.assertEqual(client.lookup('a'), {'pidx': 'a', 'status': 'Completed'})
+        self.assertEqual(self.server.requests, ['/lookup/'] * 3)
+
+    def test_lookup_gives_up_after_retries(self):
+        self.reply((500, {}))
+        client = khalti.KhaltiClient(self.config())
+
+        with self.assertRaises(khalti.KhaltiUnavailable) as raised:
+            client.lookup('a')
+        self.assertEqual(raised.exception.status_code, 500)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.reply((404, {'detail': 'Not found.'}))
+        client = khalti.KhaltiClient(self.config())
+
+        with self.assertRaises(khalti.KhaltiError) as raised:
+            client.lookup('a')
+        self.assertNotIsInstance(raised.exception, khalti.KhaltiUnavailable)
+        self.assertEqual(raised.exception.status_code, 404)
+        self.assertEqual(raised.exception.data, {'detail': 'Not found.'})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_initiate_is_never_retried(self):
+        self.reply((503, {}))
+        client = khalti.KhaltiClient(self.config())
+
+        with self.assertRaises(khalti.KhaltiUnavailable):
+            client.initiate({'amount': '2000'})
+        self.assertEqual(self.server.requests, ['/initiate/'])
+
+    def test_read_timeout(self):
+        self.reply((200, {}, 0.5))
+        client = khalti.KhaltiClient(self.config(READ_TIMEOUT=0.1, RETRIES=1))
+
+        with self.assertRaises(khalti.KhaltiUnavailable):
+            client.lookup('a')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        self.reply((500, {}))
+        client = khalti.KhaltiClient(self.config(RETRIES=0))
+
+        for _ in range(2):
+            with self.assertRaises(khalti.KhaltiUnavailable):
+                client.lookup('a')
+        with self.assertRaises(khalti.KhaltiUnavailable):
+            client.lookup('a')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_breaker_half_opens_after_cooldown(self):
+        self.reply((500, {}), (500, {}), (500, {}), (200, {'status': 'Completed'}))
+        client = khalti.KhaltiClient(self.config(RETRIES=0, BREAKER_COOLDOWN=0.1))
+
+        for _ in range(2):
+            with self.assertRaises(khalti.KhaltiUnavailable):
+                client.lookup('a')
+
+        # The probe after the cooldown fails, so the breaker opens again
+        time.sleep(0.15)
+        with self.assertRaises(khalti.KhaltiUnavailable):
+            client.lookup('a')
+        with self.assertRaises(khalti.KhaltiUnavailable):
+            client.lookup('a')
+        self.assertEqual(len(self.server.requests), 3)
+
+        # A successful probe closes it
+        time.sleep(0.15)
+        self.assertEqual(client.lookup('a'), {'status': 'Completed'})
+        self.assertEqual(client.lookup('a'), {'status': 'Completed'})
+        self.assertEqual(len(self.server.requests), 5)
+
+
+class ReconcilePaymentsTests(KhaltiStubMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        doctor = Doctor.objects.create(first_name='Asha', last_name='Rai', image='images/a.png', email='a@example.com',
+                                       phone_number='9800000000', speciality='Cardiology')
+        self.appointment = Appointment.objects.create(doctor=doctor, date='2030-01-01', time='10:00', remark='')
+
+        settings = override_settings(KHALTI={**self.config(RETRIES=0, BREAKER_THRESHOLD=100),
+                                             'RECONCILE_WORKERS': 2})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        khalti._client = None
+        self.addCleanup(setattr, khalti, '_client', None)
+
+    def pending(self, pidx, amount=20):
+        return Payment.objects.create(appointment=self.appointment, amount=amount, payment_status='P',
+                                      payment_method=Payment.PAYMENT_KHALTI, pidx=pidx)
+
+    def reconcile(self):
+        call_command('reconcile_payments', batch_size=2, stdout=StringIO(), stderr=StringIO())
+
+    def test_final_statuses(self):
+        payments = {pidx: self.pending(pidx) for pidx in ('paid', 'underpaid', 'expired', 'waiting', 'unknown')}
+        self.server.by_pidx = {
+            'paid': (200, {'status': 'Completed', 'total_amount': 2000}, 0),
+            'underpaid': (200, {'status': 'Completed', 'total_amount': 100}, 0),
+            'expired': (200, {'status': 'Expired', 'total_amount': 2000}, 0),
+            'waiting': (200, {'status': 'Pending', 'total_amount': 2000}, 0),
+            'unknown': (404, {'detail': 'Not found.', 'error_key': 'validation_error'}, 0),
+        }
+
+        self.reconcile()
+
+        states = {pidx: Payment.objects.values_list('payment_status', 'verified_at').get(pk=payment.pk)
+                  for pidx, payment in payments.items()}
+        self.assertEqual({pidx: status for pidx, (status, _) in states.items()}, {
+            'paid': 'S', 'underpaid': 'F', 'expired': 'F', 'waiting': 'P', 'unknown': 'F',
+        })
+        self.assertEqual({pidx for pidx, (_, verified_at) in states.items() if verified_at is None}, {'waiting'})
+
+        requests = len(self.server.requests)
+        self.reconcile()
+        self.assertEqual(len(self.server.requests), requests + 1)
+
+    def test_other_client_errors_stay_pending(self):
+        payment = self.pending('a')
+        self.server.by_pidx = {'a': (401, {'detail': 'Invalid token.'}, 0)}
+
+        self.reconcile()
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.payment_status, payment.verified_at), ('P', None))
+
+    def test_gateway_down_stops_early(self):
+        for pidx in ('a', 'b', 'c', 'd'):
+            self.pending(pidx)
+        self.reply((503, {}))
+
+        self.reconcile()
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertFalse(Payment.objects.exclude(payment_status='P').exists())
+
+    def test_rollups_follow_the_new_status(self):
+        self.pending('a')
+        self.server.by_pidx = {'a': (200, {'status': 'Completed', 'total_amount': 2000}, 0)}
+
+        self.reconcile()
+
+        self.assertEqual(
+            list(PaymentRollup.objects.values_list('payment_status', 'count', 'amount')),
+            [('S', 1, Decimal('20.00'))],
+        )
+
+
+class RebuildPaymentRollupsTests(TestCase):
+
+    def test_rebuild_matches_the_payments_across_day_ranges(self):
+        doctor = Doctor.objects.create(first_name='Asha', last_name='Rai', image='images/a.png', email='a@example.com',
+                                       phone_number='9800000000', speciality='Cardiology')
+        appointment = Appointment.objects.create(doctor=doctor, date='2030-01-01', time='10:00', remark='')
+        now = timezone.now()
+        for days_ago, amount in ((9, 10), (9, 15), (4, 20), (0, 25)):
+            Payment.objects.create(appointment=appointment, amount=amount, payment_method='E', payment_status='S',
+                                   created_at=now - timedelta(days=days_ago))
+        expected = sorted(PaymentRollup.objects.values_list('day', 'count', 'amount'))
+        PaymentRollup.objects.update(count=99)
+        PaymentRollup.objects.create(day=now.date() - timedelta(days=30), doctor=doctor, payment_method='E',
+                                     payment_status='S', count=1, amount=5)
+
+        call_command('rebuild_payment_rollups', days=2, stdout=StringIO())
+
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(sorted(PaymentRollup.objects.values_list('day', 'count', 'amount')), expected)
+
+
+class PaymentTests(TestCase):
+
+    def setUp(self):
+        doctor = Doctor.objects.create(first_name='Asha', last_name='Rai', image='images/a.png', email='a@example.com',
+                                       phone_number='9800000000', speciality='Cardiology')
+        self.appointment = Appointment.objects.create(doctor=doctor, date='2030-01-01', time='10:00', remark='')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='patient', email='p@example.com'))
+
+    def pay(self, **data):
+        return self.client.post('/api/booking/payments', {
+            'appointment': self.appointment.pk, 'amount': 20, 'payment_status': 'S', **data,
+        }, format='json')
+
+    def test_khalti_payments_need_a_pidx(self):
+        response = self.pay(payment_method='K')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pidx', response.json())
+        self.assertFalse(Payment.objects.exists())
+
+    def test_khalti_payments_start_pending(self):
+        response = self.pay(payment_method='K', pidx='abc', verified_at='2030-01-01T00:00:00Z')
+
+        self.assertEqual(response.status_code, 201)
+        payment = Payment.objects.get()
+        self.assertEqual((payment.payment_status, payment.verified_at), ('P', None))
+
+    def test_completing_an_initiated_khalti_payment_returns_it(self):
+        payment = Payment.objects.create(appointment=self.appointment, amount=20, payment_method='K',
+                                         payment_status='P', pidx='abc')
+
+        response = self.pay(payment_method='K', pidx='abc')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['id'], response.json()['payment_status']), (payment.pk, 'P'))
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_khalti_pidx_of_another_appointment_is_rejected(self):
+        other = Appointment.objects.create(doctor=self.appointment.doctor, date='2030-01-02', time='10:00', remark='')
+        Payment.objects.create(appointment=other, amount=20, payment_method='K', payment_status='P', pidx='abc')
+
+        response = self.pay(payment_method='K', pidx='abc')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pidx', response.json())
+        self.assertEqual(Payment.objects.count(), 1)
+
+
+class IdempotencyTests(KhaltiStubMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        doctor = Doctor.objects.create(first_name='Asha', last_name='Rai', image='images/a.png', email='a@example.com',
+                                       phone_number='9800000000', speciality='Cardiology')
+        self.appointment = Appointment.objects.create(doctor=doctor, date='2030-01-01', time='10:00', remark='')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='patient', email='p@example.com'))
+
+        settings = override_settings(KHALTI={**self.config(RETRIES=0), 'APPOINTMENT_FEE': 20})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        khalti._client = None
+        self.addCleanup(setattr, khalti, '_client', None)
+
+    def pay(self, key, amount=20):
+        return self.client.post('/api/booking/payments', {
+            'appointment': self.appointment.pk, 'amount': amount, 'payment_method': 'E', 'payment_status': 'S',
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.pay('k1')
+        retry = self.pay('k1')
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.pay('k1')
+
+        self.assertEqual(self.pay('k1', amount=30).status_code, 422)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_retry_while_the_first_request_runs(self):
+        self.pay('k1')
+        # As left by a first request that has claimed the key and is still running
+        IdempotencyKey.objects.update(status_code=None, response=None)
+
+        self.assertEqual(self.pay('k1').status_code, 409)
+
+    def test_abandoned_claims_are_taken_over(self):
+        self.pay('k1')
+        IdempotencyKey.objects.update(status_code=None, response=None, expires_at=timezone.now())
+
+        self.assertEqual(self.pay('k1').status_code, 201)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_anonymous_initiation_is_replayed(self):
+        self.reply((200, {'pidx': 'p1', 'payment_url': 'https://pay'}))
+        url = f'/api/booking/appointment/{self.appointment.pk}/initiate-khalti'
+
+        responses = [APIClient().get(url, HTTP_IDEMPOTENCY_KEY='k1') for _ in range(2)]
+
+        self.assertEqual([response.json()['pidx'] for response in responses], ['p1', 'p1'])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(Payment.objects.filter(pidx='p1').count(), 1)
+
+    def test_server_errors_release_the_key(self):
+        self.reply((503, {}), (200, {'pidx': 'p1', 'payment_url': 'https://pay'}))
+        url = f'/api/booking/appointment/{self.appointment.pk}/initiate-khalti'
+
+        self.assertEqual(APIClient().get(url, HTTP_IDEMPOTENCY_KEY='k1').status_code, 503)
+        self.assertEqual(APIClient().get(url, HTTP_IDEMPOTENCY_KEY='k1').status_code, 200)
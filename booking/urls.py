@@ -5,7 +5,9 @@ from .views import *
 urlpatterns = [
     # Doctor
     path('doctors', doctors),
+    path('doctors/specialities', doctor_specialities),
     path('doctors/<str:doctor_id>', doctor_detail),
+    path('doctors/<str:doctor_id>/slots', doctor_slots),
 
     # Appointment
     path('appointments', appointments),
@@ -18,4 +20,7 @@ urlpatterns = [
     # Payment
     path('payments', make_payment),
     path('payments/<str:payment_id>', payment_detail),
+
+    # Reports
+    path('reports/revenue', revenue_report),
 ]
@@ -1,18 +1,25 @@
-import json
-import requests
-
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from drf_spectacular.utils import extend_schema
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import status
-from rest_framework.decorators import api_view
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import RetrieveAPIView
 
-from .models import Doctor, Appointment, Payment
-from .serializers import DoctorSerializer, AppointmentSerializer, PaymentSerializer
+from . import directory, khalti, slots
+from .idempotency import idempotent
+from .models import Doctor, Appointment, Payment, PaymentRollup
+from .pagination import AppointmentPagination, PastAppointmentPagination
+from .serializers import DoctorSerializer, AppointmentSerializer, PaymentSerializer, SlotRangeSerializer, \
+    DaySlotsSerializer, AppointmentFilterSerializer, DoctorFilterSerializer, SpecialityCountSerializer, \
+    RevenueFilterSerializer, PaymentRollupSerializer
 
 """
 Doctor View
@@ -23,17 +30,23 @@ Doctor View
     request=DoctorSerializer,
     methods=["POST"]
 )
+@extend_schema(
+    parameters=[DoctorFilterSerializer],
+    responses=DoctorSerializer(many=True),
+    methods=["GET"]
+)
 @api_view(['GET', 'POST'])
 def doctors(request):
     """
     List all doctors or create a new doctor
+    ?speciality=name
     :param request:
     :return:
     """
     if request.method == 'GET':
-        doctors = Doctor.objects.all()
-        serializer = DoctorSerializer(doctors, many=True, context={'request': request})
-        return Response(serializer.data)
+        filters = DoctorFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        return Response(directory.doctors(request, filters.validated_data.get('speciality')))
 
     elif request.method == 'POST':
         serializer = DoctorSerializer(data=request.data, context={request: request})
@@ -43,6 +56,19 @@ def doctors(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@extend_schema(
+    responses=SpecialityCountSerializer(many=True),
+)
+@api_view(['GET'])
+def doctor_specialities(request):
+    """
+    Number of doctors per speciality
+    :param request:
+    :return:
+    """
+    return Response(SpecialityCountSerializer(directory.speciality_counts(), many=True).data)
+
+
 @api_view(['GET', 'DELETE'])
 def doctor_detail(request, doctor_id):
     """
@@ -62,31 +88,102 @@ def doctor_detail(request, doctor_id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@extend_schema(
+    parameters=[
+        OpenApiParameter('start', OpenApiTypes.DATE),
+        OpenApiParameter('end', OpenApiTypes.DATE),
+    ],
+    responses=DaySlotsSerializer(many=True),
+    methods=["GET"]
+)
+@api_view(['GET'])
+def doctor_slots(request, doctor_id):
+    """
+    Free appointment slots of a doctor, grouped by date
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD (defaults to the coming week)
+    :param request:
+    :param doctor_id:
+    :return:
+    """
+    doctor = get_object_or_404(Doctor, id=doctor_id)
+    query = SlotRangeSerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+
+    free = slots.free_slots(doctor.id, query.validated_data['start'], query.validated_data['end'])
+    serializer = DaySlotsSerializer([{'date': date, 'slots': times} for date, times in free], many=True)
+    return Response(serializer.data)
+
+
 """
 Appointment View
 """
 
 
+def _book(serializer):
+    """
+    Save an appointment; the unique (doctor, date, time) constraint turns a
+    slot taken in the meantime into a 409.
+    """
+    try:
+        with transaction.atomic():
+            serializer.save()
+    except IntegrityError:
+        return Response({'detail': 'This slot is already booked.'}, status=status.HTTP_409_CONFLICT)
+    return None
+
+
 @extend_schema(
     request=AppointmentSerializer,
     methods=["POST"]
 )
+@extend_schema(
+    parameters=[AppointmentFilterSerializer],
+    responses=AppointmentSerializer(many=True),
+    methods=["GET"]
+)
 @api_view(['POST', 'GET'])
+@idempotent()
 def appointments(request):
     """
-    List all appointments
+    List appointments in calendar order, or create one
+    ?doctor=id&start=YYYY-MM-DD&end=YYYY-MM-DD&when=upcoming|past (past is newest first)
+    ?cursor=next/previous cursor&page_size=number
     :param request:
     :return:
     """
     if request.method == 'GET':
-        appointments = Appointment.objects.all()
-        serializer = AppointmentSerializer(appointments, many=True)
-        return Response(serializer.data)
+        filters = AppointmentFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+
+        appointments = Appointment.objects.select_related('doctor')
+        if 'doctor' in params:
+            appointments = appointments.filter(doctor_id=params['doctor'])
+        if 'start' in params:
+            appointments = appointments.filter(date__gte=params['start'])
+        if 'end' in params:
+            appointments = appointments.filter(date__lte=params['end'])
+
+        paginator = AppointmentPagination()
+        if 'when' in params:
+            now = timezone.localtime()
+            upcoming = Q(date__gt=now.date()) | Q(date=now.date(), time__gte=now.time())
+            if params['when'] == AppointmentFilterSerializer.WHEN_UPCOMING:
+                appointments = appointments.filter(upcoming)
+            else:
+                appointments = appointments.exclude(upcoming)
+                paginator = PastAppointmentPagination()
+
+        page = paginator.paginate_queryset(appointments, request)
+        serializer = AppointmentSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     elif request.method == 'POST':
         serializer = AppointmentSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            conflict = _book(serializer)
+            if conflict:
+                return conflict
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -104,7 +201,7 @@ def appointment_detail(request, appointment_id):
     :return:
     """
     try:
-        appointment = get_object_or_404(Appointment, id=appointment_id)
+        appointment = get_object_or_404(Appointment.objects.select_related('doctor'), id=appointment_id)
     except Appointment.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -115,7 +212,9 @@ def appointment_detail(request, appointment_id):
     elif request.method == 'PUT':
         serializer = AppointmentSerializer(appointment, data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            conflict = _book(serializer)
+            if conflict:
+                return conflict
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -134,12 +233,25 @@ Payment View
     methods=["POST"]
 )
 @api_view(['POST'])
+@idempotent()
 def make_payment(request):
     """
     Make Payment
+    Completing a Khalti ePayment started by `InitiateKhaltiView` returns the
+    payment recorded for its pidx as it stands, pending until
+    `manage.py reconcile_payments` settles it.
     :param request:
     :return:
     """
+    pidx = request.data.get('pidx')
+    if pidx:
+        payment = Payment.objects.filter(pidx=pidx).first()
+        if payment is not None:
+            if str(payment.appointment_id) != str(request.data.get('appointment')):
+                return Response({'pidx': ['This ePayment belongs to another appointment.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(PaymentSerializer(payment).data)
+
     serializer = PaymentSerializer(data=request.data)
     if serializer.is_valid():
         serializer.save()
@@ -165,34 +277,69 @@ def payment_detail(request, payment_id):
         return Response(serializer.data)
 
 
+@extend_schema(
+    parameters=[RevenueFilterSerializer],
+    responses=PaymentRollupSerializer(many=True),
+)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def revenue_report(request):
+    """
+    Daily payment count and amount per doctor, method and status
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD&doctor=id&payment_method=K|E&payment_status=P|F|S
+    :param request:
+    :return:
+    """
+    filters = RevenueFilterSerializer(data=request.query_params)
+    filters.is_valid(raise_exception=True)
+    params = filters.validated_data
+
+    rollups = PaymentRollup.objects.filter(day__range=(params['start'], params['end']))
+    if 'doctor' in params:
+        rollups = rollups.filter(doctor_id=params['doctor'])
+    for field in ('payment_method', 'payment_status'):
+        if field in params:
+            rollups = rollups.filter(**{field: params[field]})
+
+    rollups = rollups.order_by('day', 'doctor_id', 'payment_method', 'payment_status')
+    return Response(PaymentRollupSerializer(rollups, many=True).data)
+
+
+@method_decorator(idempotent(methods=('GET',)), name='get')
 class InitiateKhaltiView(RetrieveAPIView):
     permission_classes = (AllowAny,)
 
     def get_object(self):
-        return Appointment.objects.get(pk=self.kwargs.get('appointment_id'))
+        return get_object_or_404(Appointment.objects.select_related('doctor'), pk=self.kwargs.get('appointment_id'))
 
     def get(self, request, *args, **kwargs):
-        url = settings.KHALTI['EPAY_INITIATE_URL']
+        appointment = self.get_object()
         payload = {
             "return_url": 'https://khalti.com',
             "website_url": 'https://khalti.com',
-            "purchase_order_id": str(self.kwargs.get('appointment_id')),
-            "purchase_order_name": str(self.kwargs.get('appointment_id')),
+            "purchase_order_id": str(appointment.pk),
+            "purchase_order_name": str(appointment.pk),
             "customer_info": {
-                "name": self.get_object().doctor.first_name,
+                "name": appointment.doctor.first_name,
                 "email": '',
                 "phone": ''
             },
-            'amount': str(20 * 100)
+            'amount': str(settings.KHALTI['APPOINTMENT_FEE'] * 100)
         }
 
-        headers = {
-            'Authorization': settings.KHALTI['EPAY_KEY'],
-            'Content-Type': 'application/json',
-        }
-        result = requests.post(url, json.dumps(payload), headers=headers)
-        result_json = result.json()
-        if result.status_code == 200:
-            return Response(result_json)
-        else:
-            raise ValidationError({'non_field_errors': result_json})
+        try:
+            result = khalti.get_client().initiate(payload)
+        except khalti.KhaltiUnavailable as error:
+            return Response(error.data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except khalti.KhaltiError as error:
+            raise ValidationError({'non_field_errors': error.data})
+
+        # Confirmed or failed later by `manage.py reconcile_payments`
+        Payment.objects.create(
+            appointment=appointment,
+            amount=settings.KHALTI['APPOINTMENT_FEE'],
+            payment_method=Payment.PAYMENT_KHALTI,
+            payment_status=Payment.PAYMENT_PENDING_STATUS,
+            pidx=result['pidx'],
+        )
+        return Response(result)
@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from . import models
+
+
+@admin.register(models.Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['kind', 'status']
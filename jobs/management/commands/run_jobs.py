@@ -0,0 +1,42 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from ampushare.pool import process_pool
+from jobs import queue
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (image processing, ...) in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=None, help='Jobs claimed per round (default: 4 per worker)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size'] or workers * 4
+
+        with process_pool(workers) as pool:
+            while True:
+                requeued = queue.requeue_stale()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale jobs'))
+
+                ids = queue.claim(batch_size)
+                if not ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                outcomes = Counter(pool.map(queue.run, ids))
+                self.stdout.write(', '.join(
+                    f'{count} {label.lower()}' for status, label in Job.STATUS_CHOICES
+                    if (count := outcomes[status])
+                ))
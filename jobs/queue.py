@@ -0,0 +1,80 @@
+"""
+Database-backed job queue.
+
+Jobs are rows of `Job`; `enqueue` adds one and `manage.py run_jobs` claims
+batches with SELECT ... FOR UPDATE SKIP LOCKED and runs them in a process
+pool. Handlers are looked up by kind in settings.JOBS['HANDLERS'] and called
+with the job payload as keyword arguments.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+
+def enqueue(kind, **payload):
+    """
+    Queue a job once the current transaction commits, so the worker never
+    sees rows the request has not written yet.
+    """
+    if kind not in settings.JOBS['HANDLERS']:
+        raise ValueError(f'No handler registered for job kind {kind!r}')
+    transaction.on_commit(lambda: Job.objects.create(kind=kind, payload=payload))
+
+
+def claim(limit):
+    """
+    Mark up to `limit` due jobs as running and return their ids. Concurrent
+    workers skip each other's locked rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.STATUS_QUEUED, run_after__lte=now)
+            .order_by('run_after')
+            .values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(id__in=ids).update(status=Job.STATUS_RUNNING, attempts=F('attempts') + 1, updated_at=now)
+    return ids
+
+
+def requeue_stale():
+    """
+    Put back jobs left running by a worker that died.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS['STALE_AFTER'])
+    return Job.objects.filter(status=Job.STATUS_RUNNING, updated_at__lt=cutoff).update(
+        status=Job.STATUS_QUEUED, updated_at=timezone.now()
+    )
+
+
+def run(job_id):
+    """
+    Run one claimed job and record its outcome. Failed jobs are retried with
+    exponential backoff until they reach settings.JOBS['MAX_ATTEMPTS'].
+    """
+    job = Job.objects.get(pk=job_id)
+    try:
+        handler = import_string(settings.JOBS['HANDLERS'][job.kind])
+        handler(**job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts >= settings.JOBS['MAX_ATTEMPTS']:
+            job.status = Job.STATUS_FAILED
+        else:
+            job.status = Job.STATUS_QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=settings.JOBS['RETRY_DELAY'] * 2 ** (job.attempts - 1))
+        job.save(update_fields=['status', 'error', 'run_after', 'updated_at'])
+        return job.status
+
+    job.status = Job.STATUS_DONE
+    job.error = ''
+    job.save(update_fields=['status', 'error', 'updated_at'])
+    return job.status
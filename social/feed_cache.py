@@ -0,0 +1,105 @@
+"""
+Response cache for the feed and post detail endpoints.
+
+Cached pages are keyed by a per-user version token and remember the version
+token of every post they render (see ampushare/versions.py). Writes never scan
+for keys: they replace the token of the affected user or post, which orphans
+every entry built on the old one (see social/signals.py). Page entries also expire after
+SOCIAL['FEED_CACHE_TIMEOUT'] seconds, which bounds staleness for changes that
+carry no token, such as a new avatar.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ampushare import versions
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _user_scope(user_id):
+    return f'social:user:{user_id}'
+
+
+def _post_scope(post_id):
+    return f'social:post:{post_id}'
+
+
+def touch_users(user_ids):
+    """
+    Invalidate every cached feed page of `user_ids`.
+    """
+    versions.bump([_user_scope(user_id) for user_id in user_ids])
+
+
+def touch_posts(post_ids):
+    """
+    Invalidate every cached response that renders one of `post_ids`.
+    """
+    versions.bump([_post_scope(post_id) for post_id in post_ids])
+
+
+def post_versions(post_ids):
+    scopes = {post_id: _post_scope(post_id) for post_id in post_ids}
+    tokens = versions.current(list(scopes.values()))
+    return {post_id: tokens[scope] for post_id, scope in scopes.items()}
+
+
+def _digest(request):
+    return hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+
+
+def feed_key(request):
+    user_id = request.user.pk
+    return versions.key(f'social:feed:{user_id}', versions.token(_user_scope(user_id)), _digest(request))
+
+
+def post_detail_key(request, post_id):
+    version = post_versions([post_id])[post_id]
+    return versions.key(f'social:detail:{post_id}', version, request.user.pk, _digest(request))
+
+
+def lookup(key, kind):
+    """
+    Return the cached response data stored under `key`, or None when it is
+    missing or one of the posts it renders has changed since.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['posts']:
+        current = post_versions(list(entry['posts']))
+        if current != entry['posts']:
+            entry = None
+
+    with _stats_lock:
+        _stats[(kind, 'miss' if entry is None else 'hit')] += 1
+    return None if entry is None else entry['data']
+
+
+def store(key, data, versions=None):
+    """
+    Cache response `data` together with the post `versions` it was rendered
+    from; read the versions before rendering so concurrent writes invalidate it.
+    """
+    cache.set(key, {'data': data, 'posts': versions or {}}, timeout=settings.SOCIAL['FEED_CACHE_TIMEOUT'])
+
+
+def stats():
+    """
+    Hit/miss counters of this process, per cached endpoint.
+    """
+    with _stats_lock:
+        counts = dict(_stats)
+
+    result = {}
+    for kind in sorted({kind for kind, _ in counts}):
+        hits, misses = counts.get((kind, 'hit'), 0), counts.get((kind, 'miss'), 0)
+        result[kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return result
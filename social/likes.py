@@ -0,0 +1,86 @@
+"""
+Idempotent like/unlike.
+
+Each call is a single round trip on PostgreSQL: the insert (or delete) of the
+`Like` row and the matching `Post.like_count` update run as one statement
+through a data-modifying CTE, which also returns the new count. The unique
+(user, post) constraint turns a repeated or concurrent like into a no-op.
+Other backends fall back to two statements in a transaction.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import Http404
+
+from . import feed_cache
+from .models import Like, Post
+
+LIKE_SQL = """
+WITH changed AS (
+    INSERT INTO {like} (user_id, post_id) VALUES (%s, %s)
+    ON CONFLICT (user_id, post_id) DO NOTHING
+    RETURNING post_id
+)
+UPDATE {post} SET like_count = like_count + (SELECT COUNT(*) FROM changed)
+WHERE id = %s
+RETURNING like_count, (SELECT COUNT(*) FROM changed)
+"""
+
+UNLIKE_SQL = """
+WITH changed AS (
+    DELETE FROM {like} WHERE user_id = %s AND post_id = %s
+    RETURNING post_id
+)
+UPDATE {post} SET like_count = GREATEST(like_count - (SELECT COUNT(*) FROM changed), 0)
+WHERE id = %s
+RETURNING like_count, (SELECT COUNT(*) FROM changed)
+"""
+
+FALLBACK_SQL = {
+    LIKE_SQL: "INSERT INTO {like} (user_id, post_id) VALUES (%s, %s) ON CONFLICT (user_id, post_id) DO NOTHING",
+    UNLIKE_SQL: "DELETE FROM {like} WHERE user_id = %s AND post_id = %s",
+}
+
+
+def _tables():
+    quote = connection.ops.quote_name
+    return {'like': quote(Like._meta.db_table), 'post': quote(Post._meta.db_table)}
+
+
+def _apply(sql, user_id, post_id, delta):
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(sql.format(**_tables()), [user_id, post_id, post_id])
+                row = cursor.fetchone()
+            else:
+                cursor.execute(FALLBACK_SQL[sql].format(**_tables()), [user_id, post_id])
+                changed = cursor.rowcount
+                if changed:
+                    Post.objects.filter(pk=post_id, like_count__gte=-delta).update(
+                        like_count=F('like_count') + delta
+                    )
+                count = Post.objects.filter(pk=post_id).values_list('like_count', flat=True).first()
+                row = None if count is None else (count, changed)
+
+        if row is None:
+            # Raising rolls back the orphan like row of a missing post
+            raise Http404('No Post matches the given query.')
+
+    like_count, changed = row
+    if changed:
+        feed_cache.touch_posts([post_id])
+    return bool(changed), like_count
+
+
+def like_post(user, post_id):
+    """
+    Like a post. Return (created, like_count); liking twice is a no-op.
+    """
+    return _apply(LIKE_SQL, user.pk, post_id, 1)
+
+
+def unlike_post(user, post_id):
+    """
+    Remove a like. Return (deleted, like_count); unliking twice is a no-op.
+    """
+    return _apply(UNLIKE_SQL, user.pk, post_id, -1)
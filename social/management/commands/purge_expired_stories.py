@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from social.models import Comment, Like, Post
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stories together with their likes, comments and timeline entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = Post.story_cutoff()
+        expired = Post.objects.filter(type=Post.STORY_POST, created_at__lt=cutoff).order_by('created_at')
+        batch_size = options['batch_size']
+        purged = 0
+
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            for model in (Like, Comment):
+                self.delete_engagement(model, ids, batch_size)
+            # One short transaction per batch keeps lock times bounded
+            with transaction.atomic():
+                Post.objects.filter(id__in=ids).delete()
+            purged += len(ids)
+            self.stdout.write(f'Purged {purged} stories...')
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} stories created before {cutoff:%Y-%m-%d %H:%M:%S %Z}.'))
+
+    @staticmethod
+    def delete_engagement(model, post_ids, batch_size):
+        """
+        Delete the `model` rows of `post_ids` `batch_size` at a time. Deleting
+        them along with the posts would load them all and run their counter
+        and cache receivers per row, for posts about to disappear.
+        """
+        rows = model.objects.filter(post_id__in=post_ids).order_by('id')
+        while True:
+            ids = list(rows.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            # Skips the post_delete receivers, which a queryset delete() runs per row
+            model.objects.filter(id__in=ids)._raw_delete(model.objects.db)
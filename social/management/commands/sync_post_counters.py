@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from social.models import Post, Like, Comment
+
+
+def count_per_post(model):
+    """
+    Correlated `SELECT COUNT(*)` of `model` rows for the outer post.
+    """
+    counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('*'))
+    return Coalesce(Subquery(counts.values('total')), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recompute Post.like_count and Post.comment_count and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted posts without fixing them')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        scanned = repaired = 0
+
+        while True:
+            batch = list(
+                Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]
+            scanned += len(batch)
+
+            drifted = list(
+                Post.objects.filter(id__in=batch)
+                .annotate(actual_likes=count_per_post(Like), actual_comments=count_per_post(Comment))
+                .exclude(like_count=F('actual_likes'), comment_count=F('actual_comments'))
+                .values_list('id', flat=True)
+            )
+            if drifted and not options['dry_run']:
+                # Recompute inside the UPDATE itself so likes landing between
+                # the scan and the write are not overwritten.
+                Post.objects.filter(id__in=drifted).update(
+                    like_count=count_per_post(Like),
+                    comment_count=count_per_post(Comment),
+                )
+            repaired += len(drifted)
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'Scanned {scanned} posts. {verb} {repaired} drifted counters.'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:41
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('social', 'Post')
+    Like = apps.get_model('social', 'Like')
+    Comment = apps.get_model('social', 'Comment')
+
+    def count_per_post(model):
+        counts = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('*'))
+        return Coalesce(Subquery(counts.values('total')), 0)
+
+    Post.objects.update(like_count=count_per_post(Like), comment_count=count_per_post(Comment))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0007_post_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
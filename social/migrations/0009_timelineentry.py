@@ -0,0 +1,82 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def populate_timelines(apps, schema_editor):
+    Post = apps.get_model('social', 'Post')
+    TimelineEntry = apps.get_model('social', 'TimelineEntry')
+    Buddy = apps.get_model('user', 'Buddy')
+
+    threshold = settings.SOCIAL['FANOUT_FOLLOWER_THRESHOLD']
+    followers = {}
+    for follower_id, following_id in Buddy.objects.values_list('follower_id', 'following_id').iterator():
+        followers.setdefault(following_id, set()).add(follower_id)
+
+    entries, fanned_out = [], []
+    posts = Post.objects.order_by('id').values_list('id', 'user_id', 'created_at')
+    for post_id, user_id, created_at in posts.iterator(chunk_size=BATCH_SIZE):
+        owners = {user_id}
+        if len(followers.get(user_id, ())) <= threshold:
+            owners |= followers.get(user_id, set())
+            fanned_out.append(post_id)
+        entries.extend(TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at) for owner_id in owners)
+
+        if len(entries) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+            Post.objects.filter(id__in=fanned_out).update(fanned_out=True)
+            entries, fanned_out = [], []
+
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    Post.objects.filter(id__in=fanned_out).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0008_post_like_count_post_comment_count'),
+        ('user', '0007_remove_profile_bio_remove_profile_phone_number'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['user', 'created_at'], name='social_post_pending_fanout_idx'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='social.post'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', 'created_at', 'post'], name='social_timeline_owner_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'post'), name='social_timeline_owner_post_uq'),
+        ),
+        migrations.RunPython(populate_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    Like = apps.get_model('social', 'Like')
+    Post = apps.get_model('social', 'Post')
+
+    duplicates = (
+        Like.objects.values('user_id', 'post_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    post_ids = set()
+    for row in duplicates.iterator():
+        Like.objects.filter(user_id=row['user_id'], post_id=row['post_id']).exclude(id=row['first_id']).delete()
+        post_ids.add(row['post_id'])
+
+    if post_ids:
+        counts = Like.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('*'))
+        Post.objects.filter(id__in=post_ids).update(like_count=Coalesce(Subquery(counts.values('total')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0011_comment_post_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='social_like_user_post_uq'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:49
+
+import ampushare.images
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0012_like_user_post_uq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=ampushare.images.RenditionImageField(blank=True, null=True, upload_to='images/'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from ampushare.images import RenditionImageField
 
 
 class Post(models.Model):
@@ -12,22 +15,66 @@ class Post(models.Model):
     ]
     caption = models.TextField()
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='images/', null=True, blank=True)
+    image = RenditionImageField(upload_to='images/', null=True, blank=True, renditions_field='image_rendered')
+    image_rendered = models.JSONField(default=dict, blank=True, editable=False)
     type = models.CharField(max_length=1, choices=POST_CHOICES, default=REGULAR_POST)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    fanned_out = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='social_post_user_created_idx'),
+            models.Index(fields=['user', 'created_at'], condition=models.Q(fanned_out=False),
+                         name='social_post_pending_fanout_idx'),
+            models.Index(fields=['type', 'created_at'], name='social_post_type_created_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.caption
 
+    @staticmethod
+    def story_cutoff():
+        """
+        Stories created before this instant have expired.
+        """
+        return timezone.now() - settings.SOCIAL['STORY_TTL']
+
 
 class Like(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='social_like_user_post_uq'),
+        ]
+
 
 class Comment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     text = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at'], name='social_comment_post_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copy of post.created_at so a page is a range scan over (owner, created_at)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='social_timeline_owner_post_uq'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'created_at', 'post'], name='social_timeline_owner_idx'),
+        ]
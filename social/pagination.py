@@ -0,0 +1,17 @@
+from django.conf import settings
+
+from ampushare.pagination import KeysetPagination
+
+
+class FeedPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    page_size = settings.SOCIAL['FEED_PAGE_SIZE']
+    max_page_size = settings.SOCIAL['FEED_MAX_PAGE_SIZE']
+
+
+class CommentPagination(FeedPagination):
+    ordering = ('created_at', 'id')
+
+
+class TimelinePagination(FeedPagination):
+    ordering = ('-created_at', '-post_id')
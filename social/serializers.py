@@ -1,7 +1,11 @@
+from django.db import models
 from rest_framework import serializers
 
+from ampushare.images import RenditionsField, rendition_urls
 from social.models import Like, Comment, Post
-from user.models import User, Profile
+from user.loaders import ProfileLoader
+from user.models import User
+from user.serializers import ProfilePrimingListSerializer, viewer_follows
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -10,16 +14,36 @@ class LikeSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class LikeStatusSerializer(serializers.Serializer):
+    post = serializers.IntegerField()
+    liked = serializers.BooleanField()
+    like_count = serializers.IntegerField()
+
+
 class UserSerializer(serializers.ModelSerializer):
     profile_pic = serializers.SerializerMethodField()
+    profile_pic_renditions = serializers.SerializerMethodField()
+    is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'profile_pic']
+        fields = ['id', 'username', 'profile_pic', 'profile_pic_renditions', 'is_following']
+        list_serializer_class = ProfilePrimingListSerializer
 
     def get_profile_pic(self, obj):
-        profile = Profile.objects.get(user=obj)
-        return profile.profile_pic.url if profile.profile_pic else None
+        profile = ProfileLoader.for_context(self.context).get(obj)
+        return profile.profile_pic.url if profile and profile.profile_pic else None
+
+    def get_profile_pic_renditions(self, obj):
+        profile = ProfileLoader.for_context(self.context).get(obj)
+        return rendition_urls(profile.profile_pic, self.context.get('request')) if profile else None
+
+    def get_is_following(self, obj):
+        return viewer_follows(self.context, obj.pk)
+
+
+class CommentListSerializer(ProfilePrimingListSerializer):
+    user_attrs = ('user',)
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -28,6 +52,7 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'user', 'post', 'text', 'created_at']
+        list_serializer_class = CommentListSerializer
 
     def create(self, validated_data):
         user_id = self.context['request'].user.id
@@ -35,28 +60,54 @@ class CommentSerializer(serializers.ModelSerializer):
         return Comment.objects.create(user=user, **validated_data)
 
 
+def resolve_liked_posts(context, posts):
+    """
+    Map post id -> whether the requesting user liked it, resolving every post
+    not seen yet in this serializer context with a single IN query.
+    """
+    liked = context.setdefault('liked_posts', {})
+    pending = [post.id for post in posts if post.id not in liked]
+    if pending:
+        user = context['request'].user
+        liked_ids = set()
+        if user.is_authenticated:
+            liked_ids = set(Like.objects.filter(user=user, post_id__in=pending).values_list('post_id', flat=True))
+        liked.update((post_id, post_id in liked_ids) for post_id in pending)
+    return liked
+
+
+class PostListSerializer(ProfilePrimingListSerializer):
+    user_attrs = ('user',)
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.Manager) else data)
+        resolve_liked_posts(self.context, posts)
+        return super(PostListSerializer, self).to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    like_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
+    image_renditions = RenditionsField(source='image')
     is_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'user', 'caption', 'image', 'type', 'created_at', 'like_count', 'comment_count', 'is_liked']
-
-    def get_like_count(self, obj):
-        return Like.objects.filter(post=obj).count()
-
-    def get_comment_count(self, obj):
-        return Comment.objects.filter(post=obj).count()
+        fields = ['id', 'user', 'caption', 'image', 'image_renditions', 'type', 'created_at', 'like_count',
+                  'comment_count', 'is_liked']
+        read_only_fields = ['like_count', 'comment_count']
+        list_serializer_class = PostListSerializer
 
     def get_is_liked(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return Like.objects.filter(user=user, post=obj).exists()
-        return False
+        return resolve_liked_posts(self.context, [obj])[obj.id]
 
     def __init__(self, *args, **kwargs):
         super(PostSerializer, self).__init__(*args, **kwargs)
         self.fields['user'].required = False
+
+    def update(self, instance, validated_data):
+        # The counters are maintained with F() updates; saving the whole row
+        # would write back a stale copy of them.
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
@@ -0,0 +1,91 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ampushare.images import renditions_ready
+from user.models import Buddy
+from . import feed_cache, timeline
+from .models import Post, Like, Comment
+
+"""
+Post counters
+
+Kept in step with the Like and Comment tables through F() updates, so
+concurrent writers never lose an increment. `manage.py sync_post_counters`
+repairs any drift.
+"""
+
+
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(like_count=F('like_count') + 1)
+
+
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, like_count__gt=0).update(like_count=F('like_count') - 1)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(comment_count=F('comment_count') - 1)
+
+
+"""
+Home timelines
+"""
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Buddy)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.follower_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Buddy)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.follower_id, instance.following_id)
+
+
+"""
+Feed cache
+"""
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    feed_cache.touch_posts([instance.pk])
+
+
+@receiver(renditions_ready, sender=Post)
+def invalidate_post_renditions(sender, pks, **kwargs):
+    # Cached responses still point at the original as a placeholder
+    feed_cache.touch_posts(pks)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_engagement(sender, instance, **kwargs):
+    feed_cache.touch_posts([instance.post_id])
+
+
+@receiver(post_save, sender=Buddy)
+@receiver(post_delete, sender=Buddy)
+def invalidate_follower_feed(sender, instance, **kwargs):
+    feed_cache.touch_users([instance.follower_id])
@@ -1,3 +1,171 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from social import feed_cache, likes
+from social.models import Comment, Like, Post, TimelineEntry
+from user.models import Buddy, User
+
+
+class LikeTests(TestCase):
+    """
+    Runs the single statement CTE path on PostgreSQL and the two statement
+    fallback elsewhere.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', email='author@example.com')
+        self.user = User.objects.create_user(username='fan', email='fan@example.com')
+        self.post = Post.objects.create(user=self.author, caption='Hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def like(self, post_id=None):
+        return self.client.post(f'/api/social/posts/{post_id or self.post.pk}/like')
+
+    def unlike(self):
+        return self.client.delete(f'/api/social/posts/{self.post.pk}/like')
+
+    def like_count(self):
+        return Post.objects.values_list('like_count', flat=True).get(pk=self.post.pk)
+
+    def test_liking_twice_counts_once(self):
+        first, second = self.like(), self.like()
+
+        self.assertEqual((first.status_code, first.json()['like_count']), (201, 1))
+        self.assertEqual((second.status_code, second.json()['like_count']), (200, 1))
+        self.assertEqual(self.like_count(), 1)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+    def test_unliking_twice_counts_once(self):
+        self.like()
+
+        first, second = self.unlike(), self.unlike()
+
+        self.assertEqual((first.status_code, first.json()['like_count']), (200, 0))
+        self.assertEqual((second.status_code, second.json()['like_count']), (200, 0))
+        self.assertEqual(self.like_count(), 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_liking_a_missing_post_leaves_no_like(self):
+        response = self.like(post_id=self.post.pk + 100)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+    def test_liking_invalidates_cached_responses(self):
+        versions = feed_cache.post_versions([self.post.pk])
+        detail = self.client.get(f'/api/social/posts/{self.post.pk}')
+
+        self.like()
+
+        self.assertNotEqual(feed_cache.post_versions([self.post.pk]), versions)
+        self.assertEqual(detail.json()['like_count'], 0)
+        self.assertEqual(self.client.get(f'/api/social/posts/{self.post.pk}').json()['like_count'], 1)
+
+    def test_repeated_like_keeps_cached_responses(self):
+        self.like()
+        versions = feed_cache.post_versions([self.post.pk])
+
+        self.like()
+
+        self.assertEqual(feed_cache.post_versions([self.post.pk]), versions)
+
+    @skipUnless(connection.vendor == 'postgresql', 'The CTE path is PostgreSQL only')
+    def test_like_and_unlike_are_one_statement(self):
+        for apply in (likes.like_post, likes.unlike_post):
+            with CaptureQueriesContext(connection) as queries:
+                apply(self.user, self.post.pk)
+            statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+            self.assertEqual(len(statements), 1, statements)
+
+
+class TimelineTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', email='author@example.com')
+        self.follower = User.objects.create_user(username='follower', email='follower@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.follower)
+
+    def timeline(self, user=None):
+        return list(TimelineEntry.objects.filter(owner=user or self.follower)
+                    .order_by('-created_at', '-id').values_list('post_id', flat=True))
+
+    def feed(self):
+        return [post['id'] for post in self.client.get('/api/social/posts').json()['results']]
+
+    def test_posts_fan_out_to_followers(self):
+        Buddy.objects.create(follower=self.follower, following=self.author)
+
+        post = Post.objects.create(user=self.author, caption='Hello')
+
+        self.assertEqual(self.timeline(), [post.pk])
+        self.assertEqual(self.timeline(self.author), [post.pk])
+        self.assertTrue(Post.objects.get(pk=post.pk).fanned_out)
+        self.assertEqual(self.feed(), [post.pk])
+
+    def test_following_backfills_and_unfollowing_prunes(self):
+        older = Post.objects.create(user=self.author, caption='Older')
+        newer = Post.objects.create(user=self.author, caption='Newer')
+        self.assertEqual(self.feed(), [])
+
+        buddy = Buddy.objects.create(follower=self.follower, following=self.author)
+        self.assertEqual(set(self.timeline()), {older.pk, newer.pk})
+        self.assertEqual(set(self.feed()), {older.pk, newer.pk})
+
+        buddy.delete()
+        self.assertEqual(self.timeline(), [])
+        self.assertEqual(self.feed(), [])
+        self.assertEqual(self.timeline(self.author), [newer.pk, older.pk])
+
+    def test_authors_above_the_threshold_are_pulled_in(self):
+        other = User.objects.create_user(username='other', email='other@example.com')
+        Buddy.objects.create(follower=self.follower, following=self.author)
+        Buddy.objects.create(follower=other, following=self.author)
+
+        with override_settings(SOCIAL={**settings.SOCIAL, 'FANOUT_FOLLOWER_THRESHOLD': 1}):
+            post = Post.objects.create(user=self.author, caption='Hello')
+
+            self.assertFalse(Post.objects.get(pk=post.pk).fanned_out)
+            self.assertEqual(self.timeline(), [])
+            self.assertEqual(self.timeline(self.author), [post.pk])
+            self.assertEqual(self.feed(), [post.pk])
+        self.assertEqual(self.timeline(), [post.pk])
+        self.assertEqual(self.timeline(other), [])
+
+
+class PurgeExpiredStoriesTests(TestCase):
+
+    def test_expired_stories_are_purged_with_their_engagement(self):
+        author = User.objects.create_user(username='author', email='author@example.com')
+        fans = [User.objects.create_user(username=f'fan{index}', email=f'fan{index}@example.com') for index in range(5)]
+        story, fresh_story, post = (
+            Post.objects.create(user=author, caption=caption, type=post_type)
+            for caption, post_type in (('Old', 'S'), ('New', 'S'), ('Post', 'P'))
+        )
+        expired = timezone.now() - settings.SOCIAL['STORY_TTL'] - timedelta(hours=1)
+        Post.objects.filter(pk__in=[story.pk, post.pk]).update(created_at=expired)
+        for target in (story, fresh_story, post):
+            Like.objects.bulk_create([Like(user=fan, post=target) for fan in fans])
+            Comment.objects.bulk_create([Comment(user=fan, post=target, text='Nice') for fan in fans])
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_expired_stories', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(set(Post.objects.values_list('pk', flat=True)), {fresh_story.pk, post.pk})
+        self.assertEqual(Like.objects.filter(post=story.pk).count() + Comment.objects.filter(post=story.pk).count(), 0)
+        self.assertEqual(Like.objects.count() + Comment.objects.count(), 20)
+        self.assertFalse(TimelineEntry.objects.filter(post=story.pk).exists())
+        self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('UPDATE')])
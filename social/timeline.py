@@ -0,0 +1,89 @@
+"""
+Fan-out-on-write home timelines.
+
+Creating a post copies a `TimelineEntry` into the timeline of its author and
+of each of their followers, so reading the home feed is a single range scan
+over (owner, created_at). Authors with more than
+SOCIAL['FANOUT_FOLLOWER_THRESHOLD'] followers are not fanned out; their
+followers pull the newest of those posts in when they open the feed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from user.models import Buddy
+from . import feed_cache
+from .models import Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def _add_entries(owner_ids, posts):
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+            for owner_id in owner_ids
+            for post_id, created_at in posts
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    feed_cache.touch_users(owner_ids)
+
+
+def fan_out_post(post):
+    """
+    Write `post` into the timelines of its author and followers, unless the
+    author is above the fan-out threshold.
+    """
+    threshold = settings.SOCIAL['FANOUT_FOLLOWER_THRESHOLD']
+    followers = list(
+        Buddy.objects.filter(following_id=post.user_id).values_list('follower_id', flat=True)[:threshold + 1]
+    )
+    if len(followers) > threshold:
+        _add_entries([post.user_id], [(post.id, post.created_at)])
+        return
+
+    _add_entries({post.user_id, *followers}, [(post.id, post.created_at)])
+    Post.objects.filter(pk=post.pk).update(fanned_out=True)
+    post.fanned_out = True
+
+
+def pull_unfanned_posts(owner):
+    """
+    Fan-out-on-read for high-follower authors: copy the newest posts that
+    were not fanned out from the accounts `owner` follows into their timeline,
+    at most once per SOCIAL['TIMELINE_PULL_INTERVAL'] seconds.
+    """
+    if not cache.add(f'social:pull:{owner.pk}', True, timeout=settings.SOCIAL['TIMELINE_PULL_INTERVAL']):
+        return
+
+    followees = Buddy.objects.filter(follower=owner).values('following')
+    posts = list(
+        Post.objects.filter(fanned_out=False, user__in=followees)
+        .order_by('-created_at')
+        .values_list('id', 'created_at')[:settings.SOCIAL['TIMELINE_PULL_LIMIT']]
+    )
+    if posts:
+        _add_entries([owner.pk], posts)
+
+
+def backfill(follower_id, following_id):
+    """
+    Copy the recent posts of a newly followed account into the follower's
+    timeline.
+    """
+    posts = list(
+        Post.objects.filter(user_id=following_id)
+        .order_by('-created_at')
+        .values_list('id', 'created_at')[:settings.SOCIAL['TIMELINE_BACKFILL_LIMIT']]
+    )
+    if posts:
+        _add_entries([follower_id], posts)
+
+
+def prune(follower_id, following_id):
+    """
+    Drop an unfollowed account's posts from the follower's timeline.
+    """
+    TimelineEntry.objects.filter(owner_id=follower_id, post__user_id=following_id).delete()
+    feed_cache.touch_users([follower_id])
@@ -5,10 +5,12 @@ from .views import *
 urlpatterns = [
     # Post
     path('posts', posts),
+    path('cache/stats', cache_stats),
+    path('stories', stories),
     path('posts/<str:post_id>', post_detail),
 
     # Like
-    path('posts/<str:post_id>/like', like_post_detail),
+    path('posts/<int:post_id>/like', like_post_detail),
 
     # Comment
     path('posts/<str:post_id>/comments', post_comments),
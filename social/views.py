@@ -1,12 +1,16 @@
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
 from user.models import Buddy
-from .models import Post, Like, Comment
-from .serializers import PostSerializer, LikeSerializer, CommentSerializer
+from . import feed_cache, likes, timeline
+from .models import Post, Comment, TimelineEntry
+from .pagination import CommentPagination, TimelinePagination
+from .serializers import PostSerializer, LikeStatusSerializer, CommentSerializer
 
 """
 Post View
@@ -20,20 +24,35 @@ Post View
 @api_view(['GET', 'POST'])
 def posts(request, post_id=None):
     """
-    List all posts, or create a new post
+    List the feed of the user and the people they follow, newest first, one
+    cursor page at a time (?cursor=...&page_size=...), or create a new post
     :param request:
     :param post_id:
     :return:
     """
     if request.method == 'GET':
-        following_users = list(Buddy.objects.filter(follower=request.user).values_list('following', flat=True))
-        following_users.append(request.user.id)
-
-        # Filter the posts based on the users that the current user follows
-        posts = Post.objects.filter(user__in=following_users)
-
-        serializer = PostSerializer(posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        if not request.query_params.get(TimelinePagination.cursor_query_param):
+            timeline.pull_unfanned_posts(request.user)
+
+        cache_key = feed_cache.feed_key(request)
+        data = feed_cache.lookup(cache_key, 'feed')
+        if data is not None:
+            return Response(data)
+
+        # The timeline already holds the posts of the user and everyone they follow
+        entries = (
+            TimelineEntry.objects.filter(owner=request.user)
+            .exclude(post__type=Post.STORY_POST, created_at__lt=Post.story_cutoff())
+            .select_related('post__user')
+        )
+
+        paginator = TimelinePagination()
+        page = paginator.paginate_queryset(entries, request)
+        versions = feed_cache.post_versions([entry.post_id for entry in page])
+        serializer = PostSerializer([entry.post for entry in page], many=True, context={'request': request})
+        response = paginator.get_paginated_response(serializer.data)
+        feed_cache.store(cache_key, response.data, versions)
+        return response
 
     elif request.method == 'POST':
         serializer = PostSerializer(data=request.data, context={'request': request})
@@ -55,13 +74,19 @@ def post_detail(request, post_id):
     :param post_id:
     :return:
     """
-    post = get_object_or_404(Post, id=post_id)
-
     if request.method == 'GET':
-        serializer = PostSerializer(post, context={'request': request})
-        return Response(serializer.data)
+        cache_key = feed_cache.post_detail_key(request, post_id)
+        data = feed_cache.lookup(cache_key, 'post_detail')
+        if data is None:
+            expired_stories = Q(type=Post.STORY_POST, created_at__lt=Post.story_cutoff())
+            post = get_object_or_404(Post.objects.exclude(expired_stories).select_related('user'), id=post_id)
+            data = PostSerializer(post, context={'request': request}).data
+            feed_cache.store(cache_key, data)
+        return Response(data)
+
+    post = get_object_or_404(Post, id=post_id)
 
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
         serializer = PostSerializer(post, data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
@@ -73,38 +98,70 @@ def post_detail(request, post_id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """
+    Hit/miss counters of the feed and post detail caches in this process
+    :param request:
+    :return:
+    """
+    return Response(feed_cache.stats())
+
+
+@api_view(['GET'])
+def stories(request):
+    """
+    Active stories of the user and the people they follow, grouped by author
+    with the most recently active author first
+    :param request:
+    :return:
+    """
+    followees = Buddy.objects.filter(follower=request.user).values('following')
+    active_stories = (
+        Post.objects.filter(Q(user__in=followees) | Q(user=request.user),
+                            type=Post.STORY_POST, created_at__gte=Post.story_cutoff())
+        .select_related('user')
+        .order_by('-created_at', '-id')
+    )
+    serializer = PostSerializer(active_stories, many=True, context={'request': request})
+
+    groups = {}
+    for story in serializer.data:
+        group = groups.setdefault(story['user']['id'], {'user': story['user'], 'stories': []})
+        group['stories'].append(story)
+    for group in groups.values():
+        # Stories play back oldest first
+        group['stories'].reverse()
+    return Response(list(groups.values()))
+
+
 """
 Like View
 """
 
 
 @extend_schema(
-    request=LikeSerializer,
-    methods=["POST"]
+    request=None,
+    responses=LikeStatusSerializer
 )
 @api_view(['POST', 'DELETE'])
 def like_post_detail(request, post_id):
     """
-        Like or unlike a post
-        :param request:
-        :param post_id:
-        :return:
-        """
+    Like or unlike a post. Both are idempotent and return the updated like count
+    :param request:
+    :param post_id:
+    :return:
+    """
     if request.method == 'POST':
-        like_exists = Like.objects.filter(user=request.user.id, post=post_id).exists()
-        if like_exists:
-            return Response({"detail": "You have already liked this post."}, status=status.HTTP_400_BAD_REQUEST)
+        changed, like_count = likes.like_post(request.user, post_id)
+        response_status = status.HTTP_201_CREATED if changed else status.HTTP_200_OK
+    else:
+        changed, like_count = likes.unlike_post(request.user, post_id)
+        response_status = status.HTTP_200_OK
 
-        like_data = {'user': request.user.id, 'post': post_id}
-        serializer = LikeSerializer(data=like_data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    elif request.method == 'DELETE':
-        post_like_instance = get_object_or_404(Like, user=request.user.id, post=post_id)
-        post_like_instance.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    serializer = LikeStatusSerializer({'post': post_id, 'liked': request.method == 'POST', 'like_count': like_count})
+    return Response(serializer.data, status=response_status)
 
 
 """
@@ -119,7 +176,8 @@ Comment View
 @api_view(['GET', 'POST'])
 def post_comments(request, post_id):
     """
-    Retrieve all comments for a post or add a new comment
+    List the comments of a post oldest first, one cursor page at a time
+    (?cursor=...&page_size=...), or add a new comment
     :param request:
     :param post_id:
     :return:
@@ -127,9 +185,12 @@ def post_comments(request, post_id):
     post = get_object_or_404(Post, id=post_id)
 
     if request.method == 'GET':
-        comments = Comment.objects.filter(post=post)
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        comments = Comment.objects.filter(post=post).select_related('user__profile')
+
+        paginator = CommentPagination()
+        page = paginator.paginate_queryset(comments, request)
+        serializer = CommentSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     elif request.method == 'POST':
         print("Inside POST")
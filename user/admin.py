@@ -17,3 +17,15 @@ class ProfileAdmin(admin.ModelAdmin):
 @admin.register(models.Buddy)
 class FollowAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(models.Suggestion)
+class SuggestionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'suggested', 'mutual_count', 'rank', 'computed_at']
+    raw_id_fields = ['user', 'suggested']
+
+
+@admin.register(models.RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ['jti', 'expires_at']
+    search_fields = ['jti']
@@ -0,0 +1,80 @@
+"""
+JWT authentication that serves the request user from the cache.
+
+The resolved `User` is cached under a per-user version token (see
+ampushare/versions.py) for USERS['AUTH_CACHE_TIMEOUT'] seconds. Saving or
+deleting a user (which covers password changes and deactivation) replaces the
+token through a signal in user/signals.py, so the next request loads a fresh
+row. Bulk `update()`s skip
+signals; call `invalidate_user` after them.
+
+The token only reaches every worker through a shared cache backend (Redis,
+Memcached, database). With a per-process backend such as the default
+locmem, other workers would keep serving a deactivated user, so the user is
+then loaded from the database on every request instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from ampushare import versions
+
+
+def _scope(user_id):
+    return f'user:{user_id}:auth'
+
+
+def invalidate_user(user_id):
+    """
+    Drop the cached copy of a user.
+    """
+    versions.bump([_scope(user_id)])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+
+    def load_user(self, user_id):
+        if not versions.is_shared():
+            return self.fetch_user(user_id)
+
+        key = versions.key(_scope(user_id), versions.token(_scope(user_id)))
+
+        user = cache.get(key)
+        if user is None:
+            user = self.fetch_user(user_id)
+            # A save racing with this load replaces the version, orphaning
+            # the stale copy stored here.
+            cache.set(key, user, timeout=settings.USERS['AUTH_CACHE_TIMEOUT'])
+        return user
+
+    def fetch_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = self.load_user(user_id)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = CachedJWTAuthentication
@@ -0,0 +1,184 @@
+"""
+In-process index of the follow graph.
+
+For every user it keeps the ids of their followers and of the accounts they
+follow as sorted `array('q')`, eight bytes per edge, so `follows` is a binary
+search. Sets are loaded lazily from `Buddy`, evicted
+least recently used once more than USERS['FOLLOW_GRAPH_MAX_EDGES'] ids are
+held, and reloaded after USERS['FOLLOW_GRAPH_TTL'] seconds.
+
+Each set is held together with the version token (ampushare/versions.py)
+its user had when it was read. `Buddy` signals (user/signals.py) replace the
+tokens of both ends of a follow or unfollow, so every worker process reloads
+the sets involved on their next use; the TTL bounds staleness for changes
+that skip signals. Without a cache backend shared by the workers no set is
+held, as no process would see the others' changes.
+
+Counts do not load sets: `counts` measures the sets already held and counts
+the rest with one grouped COUNT over the Buddy indexes, so listing a large
+account never pulls its follower ids into memory.
+"""
+import bisect
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count
+
+from ampushare import versions
+from user.models import Buddy
+
+FOLLOWERS = 'followers'
+FOLLOWING = 'following'
+
+# direction -> (column holding the user, column holding the other end)
+_COLUMNS = {
+    FOLLOWERS: ('following_id', 'follower_id'),
+    FOLLOWING: ('follower_id', 'following_id'),
+}
+
+
+def _scope(user_id):
+    return f'user:{user_id}:follows'
+
+
+class FollowGraph:
+    def __init__(self):
+        self._sets = OrderedDict()
+        self._edges = 0
+        self._lock = threading.RLock()
+
+    def _cached(self, key, token):
+        entry = self._sets.get(key)
+        if entry is None:
+            return None
+        loaded_at, loaded_token, ids = entry
+        if loaded_token != token or time.monotonic() - loaded_at > settings.USERS['FOLLOW_GRAPH_TTL']:
+            self._discard(key)
+            return None
+        self._sets.move_to_end(key)
+        return ids
+
+    def _discard(self, key):
+        _, _, ids = self._sets.pop(key)
+        self._edges -= len(ids)
+
+    def _store(self, key, token, ids):
+        if key in self._sets:
+            self._discard(key)
+        self._sets[key] = (time.monotonic(), token, ids)
+        self._edges += len(ids)
+        while self._edges > settings.USERS['FOLLOW_GRAPH_MAX_EDGES'] and len(self._sets) > 1:
+            self._discard(next(iter(self._sets)))
+
+    def _held(self, direction, user_ids):
+        """
+        Return ({user_id: held ids or None}, {user_id: current token}).
+        """
+        if not versions.is_shared():
+            return dict.fromkeys(user_ids), {}
+        tokens = versions.current([_scope(user_id) for user_id in user_ids])
+        tokens = {user_id: tokens[_scope(user_id)] for user_id in user_ids}
+        with self._lock:
+            held = {user_id: self._cached((direction, user_id), tokens[user_id]) for user_id in user_ids}
+        return held, tokens
+
+    def _load(self, direction, user_ids):
+        """
+        Return {user_id: sorted ids} for `direction`, fetching every set not
+        held yet with a single query.
+        """
+        # Tokens are read before the rows, so a follow committed in between
+        # leaves the set stored here already outdated
+        found, tokens = self._held(direction, user_ids)
+        missing = [user_id for user_id, ids in found.items() if ids is None]
+        if not missing:
+            return found
+
+        column, other = _COLUMNS[direction]
+        loaded = {user_id: array('q') for user_id in missing}
+        rows = (
+            Buddy.objects.filter(**{f'{column}__in': missing})
+            .order_by(column, other)
+            .values_list(column, other)
+        )
+        for user_id, other_id in rows.iterator(chunk_size=10000):
+            loaded[user_id].append(other_id)
+
+        if tokens:
+            with self._lock:
+                for user_id, ids in loaded.items():
+                    self._store((direction, user_id), tokens[user_id], ids)
+        found.update(loaded)
+        return found
+
+    def prime(self, user_ids, directions=(FOLLOWERS, FOLLOWING)):
+        """
+        Load the sets of every user in `user_ids` with one query per direction.
+        """
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        if user_ids:
+            for direction in directions:
+                self._load(direction, user_ids)
+
+    def followers(self, user_id):
+        return self._load(FOLLOWERS, [user_id])[user_id]
+
+    def following(self, user_id):
+        return self._load(FOLLOWING, [user_id])[user_id]
+
+    def follows(self, follower_id, following_id):
+        return self.contains(self.following(follower_id), following_id)
+
+    @staticmethod
+    def contains(ids, user_id):
+        index = bisect.bisect_left(ids, user_id)
+        return index < len(ids) and ids[index] == user_id
+
+    def mutuals(self, a, b):
+        """
+        Whether `a` and `b` follow each other.
+        """
+        return self.follows(a, b) and self.follows(b, a)
+
+    def counts(self, direction, user_ids):
+        """
+        Return {user_id: size of its `direction` set} for `user_ids`.
+        """
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        held, _ = self._held(direction, user_ids)
+        counts = {user_id: len(ids) for user_id, ids in held.items() if ids is not None}
+
+        missing = [user_id for user_id in user_ids if user_id not in counts]
+        if missing:
+            column, _ = _COLUMNS[direction]
+            counts.update(dict.fromkeys(missing, 0))
+            counts.update(
+                Buddy.objects.filter(**{f'{column}__in': missing})
+                .order_by().values(column).annotate(total=Count('*'))
+                .values_list(column, 'total')
+            )
+        return counts
+
+    def follower_count(self, user_id):
+        return self.counts(FOLLOWERS, [user_id])[user_id]
+
+    def following_count(self, user_id):
+        return self.counts(FOLLOWING, [user_id])[user_id]
+
+    def touch(self, *user_ids):
+        """
+        Make every process reload the sets of `user_ids`, e.g. both ends of a
+        follow.
+        """
+        versions.bump([_scope(user_id) for user_id in user_ids])
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+            self._edges = 0
+
+
+graph = FollowGraph()
@@ -0,0 +1,60 @@
+from user.models import Profile, User
+
+
+class ProfileLoader:
+    """
+    Request-scoped identity map of `Profile` rows keyed by user id.
+
+    Serializers prime it with every user they are about to render; profiles
+    that are not loaded yet are fetched in a single query and attached to the
+    user instances, so `user.profile` no longer hits the database per row and
+    resolves to None instead of raising when a user has no profile.
+    """
+    profile_rel = User._meta.get_field('profile')
+    user_field = Profile._meta.get_field('user')
+
+    def __init__(self):
+        self._profiles = {}
+
+    @classmethod
+    def for_context(cls, context):
+        """
+        Return the loader shared by every serializer rendering the current
+        request, or one bound to the serializer context when there is none.
+        """
+        request = context.get('request')
+        if request is None:
+            return context.setdefault('profile_loader', cls())
+
+        loader = getattr(request, '_profile_loader', None)
+        if loader is None:
+            loader = request._profile_loader = cls()
+        return loader
+
+    def prime(self, users):
+        users = [user for user in users if user is not None]
+
+        missing = set()
+        for user in users:
+            if user.pk in self._profiles:
+                continue
+            if self.profile_rel.is_cached(user):
+                # Already fetched, e.g. through select_related('user__profile').
+                self._profiles[user.pk] = self.profile_rel.get_cached_value(user)
+            else:
+                missing.add(user.pk)
+
+        if missing:
+            found = {profile.user_id: profile for profile in Profile.objects.filter(user_id__in=missing)}
+            for user_id in missing:
+                self._profiles[user_id] = found.get(user_id)
+
+        for user in users:
+            profile = self._profiles[user.pk]
+            self.profile_rel.set_cached_value(user, profile)
+            if profile is not None and not self.user_field.is_cached(profile):
+                self.user_field.set_cached_value(profile, user)
+
+    def get(self, user):
+        self.prime([user])
+        return self._profiles[user.pk]
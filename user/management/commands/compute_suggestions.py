@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from ampushare.pool import process_pool
+from user.models import User
+from user.suggestions import compute_chunk
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "people you may know" suggestions of every user in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=500, help='Users handled per task')
+
+    def chunks(self, chunk_size):
+        last_id = 0
+        while True:
+            chunk = list(
+                User.objects.filter(id__gt=last_id, is_active=True)
+                .order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not chunk:
+                return
+            last_id = chunk[-1]
+            yield chunk
+
+    def handle(self, *args, **options):
+        users = written = 0
+
+        with process_pool(options['workers']) as pool:
+            chunks = list(self.chunks(options['chunk_size']))
+            for chunk, count in zip(chunks, pool.map(compute_chunk, chunks)):
+                users += len(chunk)
+                written += count
+
+        self.stdout.write(self.style.SUCCESS(f'Computed {written} suggestions for {users} users.'))
@@ -0,0 +1,176 @@
+import csv
+import json
+import os
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from ampushare.pool import process_pool
+from user.models import Profile, User
+from user.serializers import UserImportSerializer
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+PROFILE_FIELDS = ('date_of_birth', 'gender')
+
+
+def hash_passwords(rows):
+    """
+    Validate and hash the passwords of `rows`; return (hash, errors) per row.
+    Rows without a password get an unusable one. Runs in a worker process.
+    """
+    results = []
+    for row in rows:
+        if not row.get('password'):
+            results.append((make_password(None), None))
+            continue
+        try:
+            validate_password(row['password'], User(**{field: row.get(field, '') for field in USER_FIELDS}))
+        except ValidationError as error:
+            results.append((None, {'password': error.messages}))
+            continue
+        results.append((make_password(row['password']), None))
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Import users and their profiles from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows inserted per transaction')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Password hashing processes')
+        parser.add_argument('--rejects', type=Path, help='Where to write rejected rows (default: <path>.rejects.jsonl)')
+
+    def read_rows(self, path, file_format):
+        """
+        Yield (line number, row) from the input without loading it whole.
+        """
+        with path.open(newline='', encoding='utf-8') as source:
+            if file_format == 'csv':
+                reader = csv.DictReader(source)
+                for row in reader:
+                    yield reader.line_num, row
+                return
+
+            for line_num, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    row = {'_error': str(error)}
+                yield line_num, row if isinstance(row, dict) else {'_error': 'Expected a JSON object'}
+
+    def reject(self, line_num, row, errors):
+        # Never write passwords to disk; unparsed lines may hold one anywhere
+        if isinstance(row, dict):
+            row = {field: value for field, value in row.items() if field != 'password'}
+        else:
+            row = None
+        self.rejects.write(json.dumps({'line': line_num, 'row': row, 'errors': errors}, default=str) + '\n')
+        self.rejected += 1
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path.is_file():
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.ndjson') else 'csv')
+        rejects_path = options['rejects'] or path.with_name(path.name + '.rejects.jsonl')
+
+        self.imported = self.rejected = 0
+        workers = options['workers']
+
+        with process_pool(workers) as pool, \
+                rejects_path.open('w', encoding='utf-8') as self.rejects:
+            batch = []
+            for line_num, row in self.read_rows(path, file_format):
+                if '_error' in row:
+                    self.reject(line_num, None, {'non_field_errors': [row['_error']]})
+                    continue
+
+                serializer = UserImportSerializer(data=row)
+                if not serializer.is_valid():
+                    self.reject(line_num, row, serializer.errors)
+                    continue
+
+                batch.append((line_num, row, serializer.validated_data))
+                if len(batch) >= options['batch_size']:
+                    self.import_batch(batch, pool, workers)
+                    batch = []
+            if batch:
+                self.import_batch(batch, pool, workers)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} users. Rejected {self.rejected} rows'
+            + (f', see {rejects_path}.' if self.rejected else '.')
+        ))
+
+    def import_batch(self, batch, pool, workers):
+        batch = self.drop_duplicates(batch)
+
+        rows = [data for _, _, data in batch]
+        chunk_size = -(-len(rows) // workers) or 1
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        hashed = [result for chunk in pool.map(hash_passwords, chunks) for result in chunk]
+
+        users, profiles = [], []
+        for (line_num, row, data), (password, errors) in zip(batch, hashed):
+            if errors:
+                self.reject(line_num, row, errors)
+                continue
+            user = User(
+                username=User.normalize_username(data['username']),
+                email=User.objects.normalize_email(data['email']),
+                first_name=data.get('first_name', ''),
+                last_name=data.get('last_name', ''),
+                password=password,
+            )
+            users.append((line_num, row, user))
+            profiles.append(Profile(**{field: data[field] for field in PROFILE_FIELDS}))
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for _, _, user in users])
+                for (_, _, user), profile in zip(users, profiles):
+                    profile.user = user
+                Profile.objects.bulk_create(profiles)
+        except IntegrityError as error:
+            # Lost a race with a concurrent signup; the batch is rolled back
+            for line_num, row, _ in users:
+                self.reject(line_num, row, {'non_field_errors': [str(error)]})
+            return
+
+        self.imported += len(users)
+        self.stdout.write(f'{self.imported} imported, {self.rejected} rejected')
+
+    def drop_duplicates(self, batch):
+        """
+        Reject rows whose username or email is taken, by an existing user or
+        by an earlier row of the batch.
+        """
+        usernames = {User.normalize_username(data['username']) for _, _, data in batch}
+        emails = {User.objects.normalize_email(data['email']) for _, _, data in batch}
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        unique = []
+        for line_num, row, data in batch:
+            username = User.normalize_username(data['username'])
+            email = User.objects.normalize_email(data['email'])
+            errors = {}
+            if username in taken_usernames:
+                errors['username'] = ['A user with that username already exists.']
+            if email in taken_emails:
+                errors['email'] = ['A user with that email already exists.']
+            if errors:
+                self.reject(line_num, row, errors)
+                continue
+            taken_usernames.add(username)
+            taken_emails.add(email)
+            unique.append((line_num, row, data))
+        return unique
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:49
+
+import ampushare.images
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0007_remove_profile_bio_remove_profile_phone_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_pic',
+            field=ampushare.images.RenditionImageField(blank=True, null=True, upload_to='images/'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_COLUMNS = ('username', 'first_name', 'last_name')
+
+
+def _index_name(column):
+    return f'user_user_{column}_trgm_idx'
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # icontains compiles to UPPER("col"::text) LIKE UPPER(%s) on PostgreSQL,
+    # so the indexes are built on that expression.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {_index_name(column)} ON user_user '
+            f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {_index_name(column)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_alter_profile_profile_pic'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 08:57
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Buddy = apps.get_model('user', 'Buddy')
+
+    duplicates = (
+        Buddy.objects.values('follower_id', 'following_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates.iterator():
+        Buddy.objects.filter(
+            follower_id=row['follower_id'], following_id=row['following_id']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0009_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='buddy',
+            index=models.Index(fields=['following', 'follower'], name='user_buddy_following_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='buddy',
+            constraint=models.UniqueConstraint(fields=('follower', 'following'), name='user_buddy_pair_uq'),
+        ),
+    ]
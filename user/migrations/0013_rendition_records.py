@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-18 09:18
+
+import ampushare.images
+from django.db import migrations, models
+
+
+def queue_renditions(apps, schema_editor):
+    # Renditions of existing images are only served once a job records them
+    Profile = apps.get_model('user', 'Profile')
+    Job = apps.get_model('jobs', 'Job')
+
+    rows = Profile.objects.exclude(profile_pic='').exclude(profile_pic__isnull=True).values_list('pk', 'profile_pic')
+    Job.objects.bulk_create((
+        Job(kind='images.renditions', payload={'model': 'user.profile', 'field': 'profile_pic', 'name': name, 'pk': pk})
+        for pk, name in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+        ('user', '0012_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='profile_pic_rendered',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_pic',
+            field=ampushare.images.RenditionImageField(blank=True, null=True, renditions_field='profile_pic_rendered', upload_to='images/'),
+        ),
+        migrations.RunPython(queue_renditions, migrations.RunPython.noop),
+    ]
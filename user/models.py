@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from ampushare.images import RenditionImageField
+
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -18,7 +20,9 @@ class Profile(models.Model):
     ]
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    profile_pic = models.ImageField(upload_to='images/', blank=True, null=True)
+    profile_pic = RenditionImageField(upload_to='images/', blank=True, null=True,
+                                      renditions_field='profile_pic_rendered')
+    profile_pic_rendered = models.JSONField(default=dict, blank=True, editable=False)
     date_of_birth = models.DateField()
     gender = models.CharField(max_length=1, choices=GENDER_CHOICE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -31,3 +35,42 @@ class Profile(models.Model):
 class Buddy(models.Model):
     follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower')
     following = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'following'], name='user_buddy_pair_uq'),
+        ]
+        indexes = [
+            models.Index(fields=['following', 'follower'], name='user_buddy_following_idx'),
+        ]
+
+
+class Suggestion(models.Model):
+    """
+    "People you may know": accounts followed by the people `user` follows,
+    ranked by how many of them do. Rebuilt by `manage.py compute_suggestions`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    mutual_count = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='user_suggestion_pair_uq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'rank'], name='user_suggestion_rank_idx'),
+        ]
+
+
+class RevokedToken(models.Model):
+    """
+    Refresh token that was rotated out, kept until it expires (user/revocation.py).
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
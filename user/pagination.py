@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from ampushare.pagination import KeysetPagination
+
+
+class SearchPagination(LimitOffsetPagination):
+    """
+    Limit/offset pages for ranked search results. Rank order has no stable
+    keyset, so pages use OFFSET, bounded by `max_offset`. Instead of counting
+    every match, each page fetches one extra row to tell whether a next page
+    exists.
+    """
+    default_limit = settings.USERS['SEARCH_PAGE_SIZE']
+    max_limit = settings.USERS['SEARCH_MAX_PAGE_SIZE']
+    max_offset = settings.USERS['SEARCH_MAX_OFFSET']
+    template = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = min(self.get_offset(request), self.max_offset)
+
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit and self.offset + self.limit < self.max_offset
+        return results[:self.limit]
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        del response_schema['properties']['count']
+        return response_schema
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = replace_query_param(self.request.build_absolute_uri(), self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+
+class BuddyPagination(KeysetPagination):
+    ordering = ('-id',)
+    page_size = settings.USERS['FOLLOW_PAGE_SIZE']
+    max_page_size = settings.USERS['FOLLOW_MAX_PAGE_SIZE']
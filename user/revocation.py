@@ -0,0 +1,108 @@
+"""
+Revocation store for rotated refresh tokens.
+
+Each refresh token is revoked by inserting its JTI into `RevokedToken`; the
+unique JTI makes the insert itself the authoritative check, so presenting a
+rotated token a second time fails even across worker processes.
+
+In front of the table sits a per-process Bloom filter of the revoked JTIs,
+rebuilt from the database every USERS['REVOCATION_BLOOM_REFRESH'] seconds.
+It has no false negatives for the JTIs it holds, so `is_revoked` answers the
+common "not revoked" case without a query and only confirms possible hits
+against the database. Rows are pruned once their token has expired, at most
+once per USERS['REVOCATION_PRUNE_INTERVAL'] seconds.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, sized for `capacity` items at the
+    given false positive rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Kirsch-Mitzenmacher: derive every index from two 64-bit hashes.
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+_lock = threading.Lock()
+_bloom = None
+_built_at = 0.0
+
+
+def _filter():
+    global _bloom, _built_at
+
+    with _lock:
+        if _bloom is not None and time.monotonic() - _built_at < settings.USERS['REVOCATION_BLOOM_REFRESH']:
+            return _bloom
+
+        jtis = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True)
+        count = jtis.count()
+        bloom = BloomFilter(
+            max(settings.USERS['REVOCATION_BLOOM_CAPACITY'], count * 2),
+            settings.USERS['REVOCATION_BLOOM_ERROR_RATE'],
+        )
+        for jti in jtis.iterator(chunk_size=10000):
+            bloom.add(jti)
+        _bloom, _built_at = bloom, time.monotonic()
+        return _bloom
+
+
+def is_revoked(jti):
+    if jti not in _filter():
+        return False
+    return RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, expires_at):
+    """
+    Record `jti` as revoked until `expires_at`. Return False if it already
+    was, i.e. the token is being reused.
+    """
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        return False
+
+    with _lock:
+        if _bloom is not None:
+            _bloom.add(jti)
+    prune()
+    return True
+
+
+def prune():
+    """
+    Delete rows of tokens that have expired anyway, at most once per
+    USERS['REVOCATION_PRUNE_INTERVAL'] seconds across all processes.
+    """
+    if cache.add('user:revocation:prune', True, timeout=settings.USERS['REVOCATION_PRUNE_INTERVAL']):
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
@@ -0,0 +1,66 @@
+"""
+User search for the profile search box.
+
+On PostgreSQL every query token is matched with `icontains` against username,
+first and last name. That is served by the pg_trgm GIN indexes created in
+user/migrations/0009_search_trigram_indexes.py, and results are ranked by
+trigram similarity. Other backends fall back to matching normalized prefixes.
+In both cases an exact username beats a username prefix, which beats a name
+prefix.
+"""
+import operator
+import unicodedata
+from functools import reduce
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def normalize(query):
+    """
+    Lowercase, NFKC-normalize and split a raw search string into tokens,
+    dropping a leading @ from handles.
+    """
+    query = unicodedata.normalize('NFKC', query).lower()
+    return [token.lstrip('@') for token in query.split() if token.lstrip('@')]
+
+
+def search(queryset, query, prefix=''):
+    """
+    Filter and rank `queryset` by `query`. `prefix` is the path from the
+    queryset's model to User, e.g. 'user__' when searching profiles.
+    """
+    tokens = normalize(query)
+    if not tokens:
+        return queryset.none()
+
+    trigram = connection.vendor == 'postgresql'
+    lookup = 'icontains' if trigram else 'istartswith'
+    for token in tokens:
+        queryset = queryset.filter(
+            reduce(operator.or_, (Q(**{f'{prefix}{field}__{lookup}': token}) for field in SEARCH_FIELDS))
+        )
+
+    whole = ' '.join(tokens)
+    queryset = queryset.annotate(search_rank=Case(
+        When(**{f'{prefix}username__iexact': whole}, then=Value(3)),
+        When(**{f'{prefix}username__istartswith': whole}, then=Value(2)),
+        When(Q(**{f'{prefix}first_name__istartswith': tokens[0]}) |
+             Q(**{f'{prefix}last_name__istartswith': tokens[-1]}), then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    ))
+    ordering = ['-search_rank']
+
+    if trigram:
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = queryset.annotate(search_similarity=Greatest(
+            *(TrigramSimilarity(f'{prefix}{field}', whole) for field in SEARCH_FIELDS)
+        ))
+        ordering.append('-search_similarity')
+
+    return queryset.order_by(*ordering, f'{prefix}username')
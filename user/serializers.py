@@ -1,13 +1,72 @@
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, models, transaction
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
 
-from user.models import Profile, Buddy, User
+from ampushare.images import RenditionsField, rendition_urls
+from user import revocation
+from user.graph import FOLLOWERS, FOLLOWING, graph
+from user.loaders import ProfileLoader
+from user.models import Profile, Buddy, User, Suggestion
 
 UserModel = get_user_model()
 
 
+class ProfileLoaderMixin:
+    """
+    Attach the rendered user's profile through the request's ProfileLoader.
+    """
+
+    def to_representation(self, instance):
+        ProfileLoader.for_context(self.context).prime([instance])
+        return super().to_representation(instance)
+
+
+def viewer_id(context):
+    """
+    Id of the authenticated user the serializer renders for, if any.
+    """
+    user = getattr(context.get('request'), 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def viewer_follows(context, user_id):
+    """
+    Whether the viewer follows `user_id`. The viewer's followings are read
+    once per serializer tree, not once per rendered user.
+    """
+    viewer = viewer_id(context)
+    if viewer is None:
+        return False
+    if 'viewer_following' not in context:
+        context['viewer_following'] = graph.following(viewer)
+    return graph.contains(context['viewer_following'], user_id)
+
+
+class ProfilePrimingListSerializer(serializers.ListSerializer):
+    """
+    Prime the ProfileLoader with every user referenced by `user_attrs` on the
+    items (or the items themselves when empty), so the whole list costs a
+    single profile query.
+    """
+    user_attrs = ()
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        if self.user_attrs:
+            users = [getattr(item, attr) for item in items for attr in self.user_attrs]
+        else:
+            users = items
+        ProfileLoader.for_context(self.context).prime(users)
+        return super().to_representation(items)
+
+
 class UserLoginSerializer(serializers.Serializer):
     username = serializers.CharField(max_length=150)
     password = serializers.CharField(
@@ -34,7 +93,7 @@ class UserLoginSerializer(serializers.Serializer):
         return attrs
 
 
-class LoggedInUserSerializer(serializers.ModelSerializer):
+class LoggedInUserSerializer(ProfileLoaderMixin, serializers.ModelSerializer):
     profile_image = serializers.ImageField(source='profile.profile_pic')
 
     class Meta:
@@ -54,17 +113,63 @@ class UserLoginResponseSerializer(serializers.Serializer):
     user = LoggedInUserSerializer()
 
 
+class ProfileListSerializer(serializers.ListSerializer):
+    """
+    Count the followers and followings of every listed user with one query
+    per direction instead of one per profile.
+    """
+
+    def to_representation(self, data):
+        profiles = list(data.all() if isinstance(data, models.Manager) else data)
+        user_ids = [profile.user_id for profile in profiles]
+        self.context['follow_counts'] = {direction: graph.counts(direction, user_ids) for direction in (FOLLOWERS, FOLLOWING)}
+        return super().to_representation(profiles)
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     user_id = serializers.IntegerField(source='user.id', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
     first_name = serializers.CharField(source='user.first_name', read_only=True)
     last_name = serializers.CharField(source='user.last_name', read_only=True)
+    profile_pic_renditions = RenditionsField(source='profile_pic')
+    is_following = serializers.SerializerMethodField()
+    follower_count = serializers.SerializerMethodField()
+    following_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Profile
+        fields = ['user_id', 'first_name', 'last_name', 'email', 'username', 'profile_pic', 'profile_pic_renditions',
+                  'is_following', 'follower_count', 'following_count', 'date_of_birth', 'gender', 'created_at',
+                  'updated_at']
+        list_serializer_class = ProfileListSerializer
+
+    def get_is_following(self, obj):
+        return viewer_follows(self.context, obj.user_id)
+
+    def _count(self, direction, user_id):
+        counts = self.context.get('follow_counts', {}).get(direction, {})
+        return counts[user_id] if user_id in counts else graph.counts(direction, [user_id])[user_id]
+
+    def get_follower_count(self, obj):
+        return self._count(FOLLOWERS, obj.user_id)
+
+    def get_following_count(self, obj):
+        return self._count(FOLLOWING, obj.user_id)
+
+
+class AutocompleteProfileSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='user.id', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+    avatar = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ['user_id', 'first_name', 'last_name', 'email', 'username', 'profile_pic', 'date_of_birth',
-                  'gender', 'created_at', 'updated_at']
+        fields = ['id', 'username', 'avatar']
+
+    def get_avatar(self, obj):
+        renditions = rendition_urls(obj.profile_pic, self.context.get('request'))
+        return renditions['thumb'] if renditions else None
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -89,6 +194,20 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
+class UserImportSerializer(serializers.Serializer):
+    """
+    One row of `manage.py import_users`. Uniqueness and password strength are
+    checked per batch by the command.
+    """
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField()
+    password = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    date_of_birth = serializers.DateField()
+    gender = serializers.ChoiceField(choices=Profile.GENDER_CHOICE)
+
+
 class PasswordResetSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
@@ -108,28 +227,82 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         return value
 
 
-class FollowBuddySerializer(serializers.ModelSerializer):
+class FollowBuddySerializer(ProfileLoaderMixin, serializers.ModelSerializer):
     profile_pic = serializers.ImageField(source='profile.profile_pic', read_only=True)
+    profile_pic_renditions = RenditionsField(source='profile.profile_pic')
 
     class Meta:
         model = User
-        fields = ['id', 'first_name', 'last_name', 'username', 'profile_pic']
+        fields = ['id', 'first_name', 'last_name', 'username', 'profile_pic', 'profile_pic_renditions']
+        list_serializer_class = ProfilePrimingListSerializer
+
+
+class BuddyListSerializer(ProfilePrimingListSerializer):
+    user_attrs = ('follower', 'following')
 
 
 class BuddySerializer(serializers.ModelSerializer):
     follower = FollowBuddySerializer(read_only=True)
     following = FollowBuddySerializer(read_only=True)
+    follower_id = serializers.PrimaryKeyRelatedField(source='follower', queryset=User.objects.all(), write_only=True)
+    following_id = serializers.PrimaryKeyRelatedField(source='following', queryset=User.objects.all(), write_only=True)
 
     class Meta:
         model = Buddy
-        fields = ['id', 'follower', 'following']
+        fields = ['id', 'follower', 'following', 'follower_id', 'following_id']
+        list_serializer_class = BuddyListSerializer
 
-    def to_representation(self, instance):
-        self.fields['follower'] = FollowBuddySerializer()
-        self.fields['following'] = FollowBuddySerializer()
-        return super(BuddySerializer, self).to_representation(instance)
-
-    def to_internal_value(self, data):
-        self.fields['follower'] = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-        self.fields['following'] = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-        return super(BuddySerializer, self).to_internal_value(data)
+    def validate(self, attrs):
+        if Buddy.objects.filter(follower=attrs['follower'], following=attrs['following']).exists():
+            raise serializers.ValidationError(_('You are already following this user.'), code='unique')
+        return attrs
+
+    def create(self, validated_data):
+        # A concurrent follow can get in between validate() and the insert
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(_('You are already following this user.'), code='unique')
+
+
+class SuggestionListSerializer(ProfilePrimingListSerializer):
+    user_attrs = ('suggested',)
+
+
+class SuggestionSerializer(serializers.ModelSerializer):
+    user = FollowBuddySerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = Suggestion
+        fields = ['user', 'mutual_count']
+        list_serializer_class = SuggestionListSerializer
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    Refresh serializer that revokes the rotated refresh token in the
+    revocation store and rejects tokens that were rotated already.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        jti = refresh[api_settings.JTI_CLAIM]
+        if revocation.is_revoked(jti):
+            raise TokenError(_('Token is blacklisted'))
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                # Loses to a concurrent refresh with the same token
+                if not revocation.revoke(jti, datetime_from_epoch(refresh['exp'])):
+                    raise TokenError(_('Token is blacklisted'))
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data['refresh'] = str(refresh)
+
+        return data
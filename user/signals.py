@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .graph import graph
+from .models import Buddy, Suggestion, User
+
+"""
+Follow graph
+
+Touched once the transaction commits, so no process reloads the sets before
+the follow is visible to it.
+"""
+
+
+@receiver(post_save, sender=Buddy)
+def add_follow_edge(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: graph.touch(instance.follower_id, instance.following_id))
+
+
+@receiver(post_delete, sender=Buddy)
+def remove_follow_edge(sender, instance, **kwargs):
+    transaction.on_commit(lambda: graph.touch(instance.follower_id, instance.following_id))
+
+
+"""
+Suggestions
+"""
+
+
+@receiver(post_save, sender=Buddy)
+def drop_followed_suggestion(sender, instance, created, **kwargs):
+    if created:
+        Suggestion.objects.filter(user_id=instance.follower_id, suggested_id=instance.following_id).delete()
+
+
+"""
+Authentication cache
+"""
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
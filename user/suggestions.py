@@ -0,0 +1,58 @@
+"""
+Friend-of-friend suggestions.
+
+A candidate for a user is anyone followed by the accounts the user follows,
+scored by how many of those accounts follow them (their mutual connections).
+The user themselves and accounts they already follow are left out. The top
+USERS['SUGGESTIONS_LIMIT'] candidates are stored as `Suggestion` rows, so
+serving them is a single range scan over (user, rank).
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Buddy, Suggestion
+
+
+def _following(user_ids):
+    following = defaultdict(set)
+    rows = Buddy.objects.filter(follower_id__in=user_ids).values_list('follower_id', 'following_id')
+    for follower_id, following_id in rows.iterator(chunk_size=10000):
+        following[follower_id].add(following_id)
+    return following
+
+
+def rank_candidates(user_id, following, second_hop, limit):
+    """
+    Return [(candidate id, mutual count)] for `user_id`, best first. Ties go
+    to the lower id so reruns are stable.
+    """
+    direct = following.get(user_id, set())
+    mutuals = Counter()
+    for followee_id in direct:
+        mutuals.update(second_hop.get(followee_id, ()))
+    for excluded in (user_id, *direct):
+        mutuals.pop(excluded, None)
+    return sorted(mutuals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def compute_chunk(user_ids):
+    """
+    Recompute and store the suggestions of `user_ids` using two queries over
+    Buddy, and return how many suggestions were written. Meant to run in a
+    worker process of `manage.py compute_suggestions`.
+    """
+    limit = settings.USERS['SUGGESTIONS_LIMIT']
+    following = _following(user_ids)
+    second_hop = _following({followee_id for ids in following.values() for followee_id in ids})
+
+    suggestions = [
+        Suggestion(user_id=user_id, suggested_id=candidate_id, mutual_count=mutual_count, rank=rank)
+        for user_id in user_ids
+        for rank, (candidate_id, mutual_count) in enumerate(rank_candidates(user_id, following, second_hop, limit))
+    ]
+    with transaction.atomic():
+        Suggestion.objects.filter(user_id__in=user_ids).delete()
+        Suggestion.objects.bulk_create(suggestions, batch_size=1000)
+    return len(suggestions)
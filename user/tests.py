@@ -1,3 +1,58 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from user.graph import graph
+from user.models import Buddy, User
+
+
+class FollowGraphTests(TestCase):
+
+    def setUp(self):
+        self.a = User.objects.create_user(username='a', email='a@example.com')
+        self.b = User.objects.create_user(username='b', email='b@example.com')
+        graph.clear()
+        self.addCleanup(graph.clear)
+
+    def shared_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def follow_elsewhere(self):
+        # As written by another worker process: no signal reaches this one
+        Buddy.objects.bulk_create([Buddy(follower=self.a, following=self.b)])
+
+    def test_held_sets_are_reloaded_once_touched(self):
+        self.shared_cache()
+        self.assertFalse(graph.follows(self.a.pk, self.b.pk))
+
+        self.follow_elsewhere()
+        self.assertFalse(graph.follows(self.a.pk, self.b.pk))
+        graph.touch(self.a.pk, self.b.pk)
+
+        self.assertTrue(graph.follows(self.a.pk, self.b.pk))
+        self.assertEqual(graph.follower_count(self.b.pk), 1)
+
+    def test_evicted_tokens_reload_held_sets(self):
+        self.shared_cache()
+        self.assertFalse(graph.follows(self.a.pk, self.b.pk))
+
+        self.follow_elsewhere()
+        cache.clear()
+
+        self.assertTrue(graph.follows(self.a.pk, self.b.pk))
+
+    def test_nothing_is_held_without_a_shared_cache(self):
+        self.assertFalse(graph.follows(self.a.pk, self.b.pk))
+
+        self.follow_elsewhere()
+
+        self.assertTrue(graph.follows(self.a.pk, self.b.pk))
+        self.assertEqual(graph.following_count(self.a.pk), 1)
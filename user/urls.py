@@ -13,6 +13,7 @@ urlpatterns = [
     path('<str:user_id>/unfollow', unfollow_user),
     path('<str:user_id>/followers', followers_list),
     path('<str:user_id>/following', following_list),
+    path('suggestions', suggestions),
 
     # Auth
     # path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -1,15 +1,18 @@
-from django.db.models import Q
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 
-from .models import Profile, Buddy, User
+from .models import Profile, Buddy, User, Suggestion
+from .pagination import BuddyPagination, SearchPagination
+from .search import search
 from .serializers import UserLoginSerializer, ProfileSerializer, UserRegistrationSerializer, PasswordResetSerializer, \
-    PasswordResetConfirmSerializer, BuddySerializer, UserLoginResponseSerializer
+    PasswordResetConfirmSerializer, BuddySerializer, UserLoginResponseSerializer, AutocompleteProfileSerializer, \
+    SuggestionSerializer
 
 
 @extend_schema(
@@ -112,7 +115,7 @@ def user_profile(request, username):
     :return:
     """
     usr_profile = get_object_or_404(Profile, user__username=username)
-    serializer = ProfileSerializer(usr_profile)
+    serializer = ProfileSerializer(usr_profile, context={'request': request})
     return Response(serializer.data)
 
 
@@ -130,33 +133,45 @@ def own_profile(request):
     usr_profile = get_object_or_404(Profile, user=request.user)
 
     if request.method == 'GET':
-        serializer = ProfileSerializer(usr_profile)
+        serializer = ProfileSerializer(usr_profile, context={'request': request})
         return Response(serializer.data)
 
     elif request.method == 'PUT':
-        serializer = ProfileSerializer(usr_profile, data=request.data)
+        serializer = ProfileSerializer(usr_profile, data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@extend_schema(
+    parameters=[
+        OpenApiParameter('search', str),
+        OpenApiParameter('mode', str, enum=['autocomplete']),
+    ],
+    responses=ProfileSerializer(many=True),
+    methods=["GET"]
+)
 @api_view(['GET'])
 def get_profiles(request):
     """
-    Get profiles with search parameters
+    Get profiles with search parameters, best matches first
     ?search=keyword
+    ?search=keyword&mode=autocomplete for a short list of id, username and avatar
     :param request:
     :return:
     """
-    search_query = request.GET.get('search', '')
-    profiles = Profile.objects.filter(
-        Q(user__username__icontains=search_query) |
-        Q(user__first_name__icontains=search_query) |
-        Q(user__last_name__icontains=search_query)
-    )
-    serializer = ProfileSerializer(profiles, many=True)
-    return Response(serializer.data)
+    profiles = search(Profile.objects.select_related('user'), request.GET.get('search', ''), prefix='user__')
+
+    if request.GET.get('mode') == 'autocomplete':
+        profiles = profiles[:settings.USERS['AUTOCOMPLETE_LIMIT']]
+        serializer = AutocompleteProfileSerializer(profiles, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    paginator = SearchPagination()
+    page = paginator.paginate_queryset(profiles, request)
+    serializer = ProfileSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 
 @extend_schema(
@@ -171,7 +186,7 @@ def follow_user(request, user_id):
     :param user_id:
     :return:
     """
-    follow_data = {'follower': request.user.id, 'following': user_id}
+    follow_data = {'follower_id': request.user.id, 'following_id': user_id}
     serializer = BuddySerializer(data=follow_data)
     if serializer.is_valid():
         serializer.save()
@@ -192,27 +207,49 @@ def unfollow_user(request, user_id):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@extend_schema(responses=BuddySerializer(many=True))
 @api_view(['GET'])
 def followers_list(request, user_id):
     """
-    Followers list
+    Followers list, newest first
+    ?cursor=next/previous cursor&page_size=number
     :param request:
     :param user_id:
     :return:
     """
-    followers = Buddy.objects.filter(following=user_id)
-    serializer = BuddySerializer(followers, many=True)
-    return Response(serializer.data)
+    followers = Buddy.objects.filter(following=user_id).select_related('follower__profile', 'following__profile')
+    return _buddy_page(request, followers)
 
 
+@extend_schema(responses=BuddySerializer(many=True))
 @api_view(['GET'])
 def following_list(request, user_id):
     """
-    Followers list
+    Following list, newest first
+    ?cursor=next/previous cursor&page_size=number
     :param request:
     :param user_id:
     :return:
     """
-    following = Buddy.objects.filter(follower=user_id)
-    serializer = BuddySerializer(following, many=True)
+    following = Buddy.objects.filter(follower=user_id).select_related('follower__profile', 'following__profile')
+    return _buddy_page(request, following)
+
+
+def _buddy_page(request, queryset):
+    paginator = BuddyPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = BuddySerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
+@extend_schema(responses=SuggestionSerializer(many=True))
+@api_view(['GET'])
+def suggestions(request):
+    """
+    People you may know, most mutual connections first
+    :param request:
+    :return:
+    """
+    suggested = Suggestion.objects.filter(user=request.user).select_related('suggested__profile').order_by('rank')
+    serializer = SuggestionSerializer(suggested, many=True, context={'request': request})
     return Response(serializer.data)